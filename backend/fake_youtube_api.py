@@ -0,0 +1,70 @@
+"""
+Offline stand-in for the YouTube Data API v3 (search.list and videos.list only).
+
+Run it and point the backend at it:
+    uvicorn fake_youtube_api:app --port 8081
+    YOUTUBE_API_ENDPOINT=http://localhost:8081/
+
+test_youtube_client.py starts it and runs YouTubeClient against it.
+"""
+import hashlib
+from typing import Optional
+from fastapi import FastAPI
+
+app = FastAPI(title="Fake YouTube Data API")
+
+# Durations cycle through short, medium and long videos
+DURATIONS = ["PT2M30S", "PT7M5S", "PT12M", "PT25M40S", "PT1H2M3S"]
+
+def _video_id(query: str, index: int) -> str:
+    return hashlib.sha1(f"{query}:{index}".encode("utf-8")).hexdigest()[:11]
+
+def _duration(video_id: str) -> str:
+    return DURATIONS[int(video_id, 16) % len(DURATIONS)]
+
+@app.get("/youtube/v3/search")
+async def search(
+    q: str = "",
+    maxResults: int = 5,
+    pageToken: Optional[str] = None,
+    part: str = "snippet",
+    type: str = "video",
+    key: Optional[str] = None
+):
+    start = int(pageToken or 0)
+    items = [
+        {
+            "kind": "youtube#searchResult",
+            "id": {"kind": "youtube#video", "videoId": _video_id(q, i)},
+            "snippet": {
+                "title": f"{q.title()} #{i + 1}",
+                "description": f"Fake result {i + 1} for '{q}'",
+                "channelTitle": "Fake Channel"
+            }
+        }
+        for i in range(start, start + min(maxResults, 50))
+    ]
+    return {
+        "kind": "youtube#searchListResponse",
+        "nextPageToken": str(start + len(items)),
+        "pageInfo": {"totalResults": 1000, "resultsPerPage": len(items)},
+        "items": items
+    }
+
+@app.get("/youtube/v3/videos")
+async def videos(
+    id: str = "",
+    part: str = "contentDetails",
+    maxResults: Optional[int] = None,
+    key: Optional[str] = None
+):
+    items = [
+        {
+            "kind": "youtube#video",
+            "id": video_id,
+            "contentDetails": {"duration": _duration(video_id), "caption": "true"},
+            "statistics": {"viewCount": str(int(video_id, 16) % 100000)}
+        }
+        for video_id in id.split(",") if video_id
+    ]
+    return {"kind": "youtube#videoListResponse", "items": items}
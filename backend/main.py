@@ -6,15 +6,31 @@ from datetime import datetime
 import os
 from dotenv import load_dotenv
 import json
+from contextlib import asynccontextmanager
 from routers import speaking
+from services.audio_transcoder import audio_transcoder
+from services.llm_cache import llm_cache
+from services.llm_gateway import llm_gateway
 
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open shared resources on startup and close them cleanly on shutdown
+    speaking.session_store.init_schema()
+    speaking.recognizer_pool.start()
+    yield
+    await speaking.recognizer_pool.close()
+    await llm_gateway.close()
+    speaking.speech_service.close()
+    audio_transcoder.close()
+
 app = FastAPI(
     title="Verba - English Learning Platform",
     description="Backend API for Verba English Learning Platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -70,6 +86,18 @@ async def get_user_progress():
         "streak": mock_user["streak_days"]
     }
 
+# Metrics Routes
+@app.get("/api/metrics")
+async def get_metrics():
+    return {
+        "speech_executor": speaking.speech_service.executor_stats(),
+        "speech_sessions": speaking.recognizer_pool.stats(),
+        "audio_transcoder": audio_transcoder.stats(),
+        "tts_cache": speaking.speech_service.tts_cache.stats(),
+        "llm_cache": llm_cache.stats(),
+        "llm_providers": llm_gateway.stats()
+    }
+
 # Speaking Routes
 @app.get("/api/speaking/prompt")
 async def get_speaking_prompt():
@@ -0,0 +1,55 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Index, LargeBinary, JSON
+from sqlalchemy.orm import relationship
+from ..database import Base
+
+class ListeningVideoRecord(Base):
+    __tablename__ = "listening_videos"
+    
+    # Vetted YouTube videos served by recommend_content, refreshed by the catalog crawler
+    video_id = Column(String, primary_key=True)
+    title = Column(String)
+    channel_title = Column(String)
+    duration_seconds = Column(Integer)
+    level_band = Column(String, index=True)  # "basic", "intermediate" or "advanced"
+    has_captions = Column(Boolean, default=False)
+    transcript_key = Column(String, nullable=True)  # Set once the transcript has been stored
+    view_count = Column(Integer, default=0)
+    crawled_at = Column(DateTime, default=datetime.utcnow)
+    
+    topics = relationship("ListeningVideoTopic", back_populates="video", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index("ix_listening_videos_band_duration", "level_band", "duration_seconds"),
+    )
+
+class ListeningVideoTopic(Base):
+    __tablename__ = "listening_video_topics"
+    
+    video_id = Column(String, ForeignKey("listening_videos.video_id"), primary_key=True)
+    topic = Column(String, primary_key=True)
+    
+    video = relationship("ListeningVideoRecord", back_populates="topics")
+    
+    __table_args__ = (
+        Index("ix_listening_video_topics_topic", "topic", "video_id"),
+    )
+
+class ListeningTranscriptRecord(Base):
+    __tablename__ = "listening_transcripts"
+    
+    # Parsed caption segments, stored as zlib-compressed JSON ([] when the video has no English captions)
+    video_id = Column(String, primary_key=True)
+    language = Column(String, default="en")
+    segments = Column(LargeBinary)
+    segment_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class ListeningQuestionSetRecord(Base):
+    __tablename__ = "listening_question_sets"
+    
+    # Validated comprehension questions, shared by every video with the same transcript
+    transcript_hash = Column(String, primary_key=True)  # sha256 of the normalized transcript
+    level_band = Column(String, primary_key=True)
+    questions = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
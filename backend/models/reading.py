@@ -0,0 +1,20 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, JSON, Index
+from ..database import Base
+
+class ReadingPassageRecord(Base):
+    __tablename__ = "reading_passages"
+    
+    # Pre-generated passages waiting to be served, grouped by level band and topic
+    id = Column(Integer, primary_key=True, index=True)
+    level_band = Column(String)  # "basic", "intermediate" or "advanced"
+    topic = Column(String)  # "" when no topic was requested
+    level = Column(Integer)
+    title = Column(String)
+    content = Column(Text)
+    questions = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_reading_passages_band_topic", "level_band", "topic"),
+    )
@@ -1,11 +1,13 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint
+from database import Base
 
 class Message(BaseModel):
     role: str
     content: str
-    timestamp: datetime = datetime.now()
+    timestamp: datetime = Field(default_factory=datetime.now)
 
 class SpeakingSession(BaseModel):
     id: Optional[str] = None
@@ -13,10 +15,43 @@ class SpeakingSession(BaseModel):
     topic: Optional[str] = None
     difficulty_level: Optional[str] = None
     conversation_history: List[Message] = []
-    created_at: datetime = datetime.now()
+    created_at: datetime = Field(default_factory=datetime.now)
     ended_at: Optional[datetime] = None
+    final_feedback: Optional[str] = None
 
 class SpeakingResponse(BaseModel):
     text: str
     feedback: Optional[dict] = None
-    score: Optional[float] = None 
\ No newline at end of file
+    score: Optional[float] = None
+
+class SpeakingGrade(BaseModel):
+    grammar: float
+    vocabulary: float
+    fluency: float
+    suggestions: List[str]
+
+class SpeakingSessionRecord(Base):
+    __tablename__ = "speaking_sessions"
+    
+    id = Column(String, primary_key=True, index=True)
+    user_id = Column(Integer, index=True)
+    topic = Column(String)
+    difficulty_level = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    ended_at = Column(DateTime)
+    final_feedback = Column(Text)
+
+class SpeakingTurnRecord(Base):
+    __tablename__ = "speaking_turns"
+    
+    # Append-only: turns are inserted, never updated
+    id = Column(Integer, primary_key=True, index=True)
+    session_id = Column(String, ForeignKey("speaking_sessions.id"), index=True)
+    turn_index = Column(Integer)
+    role = Column(String)
+    content = Column(Text)
+    timestamp = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint("session_id", "turn_index", name="uq_speaking_turns_session_turn"),
+    )
@@ -1,19 +1,36 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
-import openai
 from ..database import get_db
 from ..models import Assessment, User
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from ..services.structured_output import request_structured, json_call, schema_instructions
+from ..services.llm_cache import LLMCache
+from ..services.llm_gateway import llm_gateway
+import asyncio
 import os
 
 router = APIRouter()
 
+# Caps concurrent LLM calls across all assessments on this worker
+llm_limiter = asyncio.Semaphore(int(os.getenv("ASSESSMENT_MAX_CONCURRENCY", "8")))
+
+# Per-stage timeouts in seconds (speaking also has to transcribe audio)
+STAGE_TIMEOUTS = {
+    "reading": float(os.getenv("ASSESSMENT_READING_TIMEOUT", "30")),
+    "listening": float(os.getenv("ASSESSMENT_LISTENING_TIMEOUT", "30")),
+    "speaking": float(os.getenv("ASSESSMENT_SPEAKING_TIMEOUT", "60")),
+    "writing": float(os.getenv("ASSESSMENT_WRITING_TIMEOUT", "30")),
+}
+
 class AssessmentResponse(BaseModel):
     question: str
     answer: str
     score: float
 
+class ScoreResult(BaseModel):
+    score: float = Field(ge=0, le=1)
+
 class InitialAssessment(BaseModel):
     reading_responses: List[AssessmentResponse]
     listening_responses: List[AssessmentResponse]
@@ -25,20 +42,21 @@ async def create_initial_assessment(
     assessment: InitialAssessment,
     db: Session = Depends(get_db)
 ):
-    # Initialize OpenAI client
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    
-    # Evaluate reading responses
-    reading_score = await evaluate_reading(assessment.reading_responses)
-    
-    # Evaluate listening responses
-    listening_score = await evaluate_listening(assessment.listening_responses)
-    
-    # Evaluate speaking (using Whisper API)
-    speaking_score = await evaluate_speaking(assessment.speaking_audio_url)
-    
-    # Evaluate writing
-    writing_score = await evaluate_writing(assessment.writing_sample)
+    # Evaluate all four skills concurrently; the slowest stage sets the total time
+    stages = {
+        "reading": evaluate_reading(assessment.reading_responses),
+        "listening": evaluate_listening(assessment.listening_responses),
+        "speaking": evaluate_speaking(assessment.speaking_audio_url),  # Using Whisper API
+        "writing": evaluate_writing(assessment.writing_sample),
+    }
+    tasks = [asyncio.create_task(run_stage(name, coro)) for name, coro in stages.items()]
+    try:
+        reading_score, listening_score, speaking_score, writing_score = await asyncio.gather(*tasks)
+    except Exception:
+        # One stage failed; don't leave the others running
+        for task in tasks:
+            task.cancel()
+        raise
     
     # Calculate overall scores (0-30 scale)
     scores = {
@@ -50,21 +68,37 @@ async def create_initial_assessment(
     
     return scores
 
+async def run_stage(name: str, coro) -> float:
+    """Run one assessment stage under its own timeout"""
+    try:
+        return await asyncio.wait_for(coro, STAGE_TIMEOUTS[name])
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail=f"{name.capitalize()} assessment timed out")
+
+async def score_with_llm(system_prompt: str, user_content: str) -> float:
+    """Ask GPT for a 0-1 score, respecting the global concurrency limit"""
+    async with llm_limiter:
+        result = await request_structured(
+            json_call([
+                {"role": "system", "content": f"{system_prompt}\n{schema_instructions(ScoreResult)}"},
+                {"role": "user", "content": user_content}
+            ]),
+            ScoreResult,
+            cache_key=LLMCache.make_key("assessment_score", system_prompt, user_content)
+        )
+    return result.score
+
 async def evaluate_reading(responses: List[AssessmentResponse]) -> float:
-    total_score = 0
-    for response in responses:
-        # Use GPT to evaluate the response
-        evaluation = await openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an English language assessment expert. Evaluate the following answer based on comprehension, accuracy, and completeness. Return a score between 0 and 1."},
-                {"role": "user", "content": f"Question: {response.question}\nAnswer: {response.answer}"}
-            ]
+    # Use GPT to evaluate every response concurrently
+    scores = await asyncio.gather(*(
+        score_with_llm(
+            "You are an English language assessment expert. Evaluate the following answer based on comprehension, accuracy, and completeness. Return a score between 0 and 1.",
+            f"Question: {response.question}\nAnswer: {response.answer}"
         )
-        score = float(evaluation.choices[0].message.content.strip())
-        total_score += score
+        for response in responses
+    ))
     
-    return total_score / len(responses)
+    return sum(scores) / len(responses)
 
 async def evaluate_listening(responses: List[AssessmentResponse]) -> float:
     # Similar to reading evaluation
@@ -75,30 +109,23 @@ async def evaluate_speaking(audio_url: str) -> float:
     try:
         # Transcribe audio
         audio_file = await download_audio(audio_url)
-        transcript = await openai.Audio.transcribe("whisper-1", audio_file)
+        async with llm_limiter:
+            transcript = await llm_gateway.transcribe(audio_file)
         
         # Evaluate pronunciation, fluency, and coherence
-        evaluation = await openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an English speaking assessment expert. Evaluate the following transcription based on pronunciation, fluency, coherence, and grammar. Return a score between 0 and 1."},
-                {"role": "user", "content": transcript["text"]}
-            ]
+        return await score_with_llm(
+            "You are an English speaking assessment expert. Evaluate the following transcription based on pronunciation, fluency, coherence, and grammar. Return a score between 0 and 1.",
+            transcript
         )
-        return float(evaluation.choices[0].message.content.strip())
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 async def evaluate_writing(sample: str) -> float:
     # Use GPT to evaluate writing
-    evaluation = await openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": "You are an English writing assessment expert. Evaluate the following writing sample based on grammar, vocabulary, coherence, and structure. Return a score between 0 and 1."},
-            {"role": "user", "content": sample}
-        ]
+    return await score_with_llm(
+        "You are an English writing assessment expert. Evaluate the following writing sample based on grammar, vocabulary, coherence, and structure. Return a score between 0 and 1.",
+        sample
     )
-    return float(evaluation.choices[0].message.content.strip())
 
 async def download_audio(url: str):
     # Implement audio download logic
@@ -1,16 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
-import openai
 import os
-from googleapiclient.discovery import build
-import yt_dlp
 from ..database import get_db
 from ..models import User, ProgressRecord
+from ..services.answer_evaluator import AnswerEvaluator
+from ..services.structured_output import request_structured, json_call
+from ..services.youtube_client import youtube_client
+from ..services.listening_catalog import ListeningCatalog
+from ..services.transcript_store import TranscriptStore, TranscriptNotFoundError, transcript_text
+from ..services.question_store import QuestionStore
+from ..services.rate_limiter import INTERACTIVE
 
 router = APIRouter()
 
+# Grades every answer of a quiz in as few LLM requests as possible
+answer_evaluator = AnswerEvaluator()
+
+# Parsed caption segments, cached in memory and in the database
+transcript_store = TranscriptStore()
+
 class ListeningContent(BaseModel):
     title: str
     url: str
@@ -20,114 +30,107 @@ class ListeningContent(BaseModel):
     transcript: Optional[str] = None
     questions: Optional[List[dict]] = None
 
+class ListeningQuestion(BaseModel):
+    question_text: str
+    type: str  # "multiple_choice" or "short_answer"
+    options: Optional[List[str]] = None
+    correct_answer: str
+
+class ListeningQuestionSet(BaseModel):
+    questions: List[ListeningQuestion]
+
 class ListeningResponse(BaseModel):
     content_id: str
     answers: List[dict]
 
+async def create_questions(transcript: str, level: int, priority: int = INTERACTIVE) -> List[dict]:
+    """Generate and validate comprehension questions for a transcript"""
+    question_set = await request_structured(
+        json_call([
+            {"role": "system", "content": f"""Generate 5 listening comprehension questions for level {level}/30 based on the transcript.
+            Include a mix of:
+            1. Main idea questions
+            2. Detail questions
+            3. Inference questions
+            4. Vocabulary questions
+            
+            Format as a JSON object with a "questions" array, each question having:
+            - question_text
+            - type (multiple_choice/short_answer)
+            - options (for multiple choice)
+            - correct_answer"""},
+            {"role": "user", "content": transcript}
+        ], priority=priority),
+        ListeningQuestionSet
+    )
+    return [question.model_dump() for question in question_set.questions]
+
+# Question sets keyed by (transcript hash, level band), generated once
+question_store = QuestionStore(create_questions)
+
+def pregenerate_questions(videos: List[tuple]):
+    """Write question sets for newly catalogued videos before anyone opens them"""
+    for video_id, band in videos:
+        async def load_transcript(video_id=video_id) -> str:
+            return transcript_text(await transcript_store.get(video_id))
+        question_store.pregenerate(load_transcript, band)
+
+# Indexed catalog of captioned videos, refreshed in the background
+listening_catalog = ListeningCatalog(
+    youtube_client,
+    on_ingest=pregenerate_questions if os.getenv("LISTENING_PREGENERATE_QUESTIONS", "false").lower() == "true" else None
+)
+
 @router.get("/recommend-content")
 async def recommend_content(
-    user_level: int,
-    topics: Optional[List[str]] = None,
-    duration_range: Optional[tuple] = None
+    user_level: int = Query(..., ge=0, le=30),
+    topics: Optional[List[str]] = Query(None),
+    duration_range: Optional[List[int]] = Query(None, description="Minimum and maximum duration in seconds")
 ):
     """Recommend YouTube content based on user's level and interests"""
-    youtube = build('youtube', 'v3', developerKey=os.getenv('YOUTUBE_API_KEY'))
-    
-    # Build search query based on topics and level
-    level_terms = {
-        (0, 10): "basic english listening",
-        (11, 20): "intermediate english listening",
-        (21, 30): "advanced english listening"
-    }
+    if duration_range is not None and (len(duration_range) != 2 or duration_range[0] > duration_range[1]):
+        raise HTTPException(status_code=400, detail="duration_range must be two values: min and max seconds")
     
-    level_term = next(term for (low, high), term in level_terms.items() 
-                     if low <= user_level <= high)
-    
-    search_query = f"{level_term}"
-    if topics:
-        search_query += f" {' '.join(topics)}"
-    
-    # Search YouTube
-    search_response = youtube.search().list(
-        q=search_query,
-        part='snippet',
-        maxResults=10,
-        type='video',
-        videoCaption='closedCaption'  # Only videos with captions
-    ).execute()
+    # Served from the local catalog; YouTube is only searched for uncatalogued topics
+    catalogued = await listening_catalog.recommend(
+        user_level,
+        topics,
+        tuple(duration_range) if duration_range else None
+    )
     
     videos = []
-    for item in search_response['items']:
-        video_id = item['id']['videoId']
-        
-        # Get video details
-        video_response = youtube.videos().list(
-            part='contentDetails,statistics',
-            id=video_id
-        ).execute()
-        
-        if video_response['items']:
-            video_details = video_response['items'][0]
-            
-            # Extract duration and convert to seconds
-            duration = video_details['contentDetails']['duration']
-            # TODO: Convert ISO 8601 duration to seconds
-            
-            videos.append(ListeningContent(
-                title=item['snippet']['title'],
-                url=f"https://www.youtube.com/watch?v={video_id}",
-                duration=duration,
-                difficulty_level=user_level,
-                topics=topics or [],
-                transcript=None  # Will be fetched when needed
-            ))
+    for video in catalogued:
+        videos.append(ListeningContent(
+            title=video['title'],
+            url=f"https://www.youtube.com/watch?v={video['video_id']}",
+            duration=video['duration_seconds'],
+            difficulty_level=user_level,
+            topics=video['topics'] or topics or [],
+            transcript=None  # Will be fetched when needed
+        ))
+    
+    # Warm the transcript store so opening a video doesn't wait on a scrape
+    transcript_store.prefetch([video['video_id'] for video in catalogued if not video['transcript_key']])
     
     return videos
 
 @router.get("/get-transcript/{video_id}")
 async def get_transcript(video_id: str):
     """Get transcript for a YouTube video"""
-    ydl_opts = {
-        'writesubtitles': True,
-        'subtitleslangs': ['en'],
-        'skip_download': True,
-    }
-    
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
-            if 'subtitles' in info and 'en' in info['subtitles']:
-                return {"transcript": info['subtitles']['en'][0]['data']}
-            else:
-                raise HTTPException(status_code=404, detail="No English transcript available")
+        segments = await transcript_store.get(video_id)
+    except TranscriptNotFoundError:
+        raise HTTPException(status_code=404, detail="No English transcript available")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"transcript": transcript_text(segments), "segments": segments}
 
 @router.post("/generate-questions")
-async def generate_questions(transcript: str, level: int):
+async def generate_questions(transcript: str, level: int = Query(..., ge=0, le=30)):
     """Generate questions based on the transcript"""
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    
-    response = await openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": f"""Generate 5 listening comprehension questions for level {level}/30 based on the transcript.
-            Include a mix of:
-            1. Main idea questions
-            2. Detail questions
-            3. Inference questions
-            4. Vocabulary questions
-            
-            Format as JSON with:
-            - question_text
-            - type (multiple_choice/short_answer)
-            - options (for multiple choice)
-            - correct_answer"""},
-            {"role": "user", "content": transcript}
-        ]
-    )
-    
-    return response.choices[0].message.content
+    # Served from the question store; only the first request for a transcript and level band calls the LLM
+    return await question_store.get(transcript, level)
 
 @router.post("/evaluate")
 async def evaluate_listening_response(
@@ -135,23 +138,13 @@ async def evaluate_listening_response(
     db: Session = Depends(get_db)
 ):
     """Evaluate user's answers to listening questions"""
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    
-    total_score = 0
-    feedback = []
-    
-    for answer in response.answers:
-        evaluation = await openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Evaluate the answer to this listening comprehension question. Provide a score (0-1) and specific feedback."},
-                {"role": "user", "content": f"Question: {answer['question']}\nUser's Answer: {answer['answer']}\nCorrect Answer: {answer['correct_answer']}"}
-            ]
-        )
-        
-        result = eval(evaluation.choices[0].message.content)
-        total_score += result["score"]
-        feedback.append(result["feedback"])
+    # Evaluate all answers together
+    results = await answer_evaluator.evaluate(
+        response.answers,
+        "Evaluate the answer to this listening comprehension question. Provide a score (0-1) and specific feedback."
+    )
+    total_score = sum(result["score"] for result in results)
+    feedback = [result["feedback"] for result in results]
     
     average_score = total_score / len(response.answers)
     
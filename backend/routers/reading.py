@@ -1,32 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
-import openai
-import os
 from ..database import get_db
 from ..models import User, ProgressRecord
+from ..services.answer_evaluator import AnswerEvaluator
+from ..services.passage_pool import PassagePool
+from ..services.structured_output import request_structured, json_call
+from ..services.rate_limiter import INTERACTIVE, BACKGROUND
 
 router = APIRouter()
 
+# Grades every answer of a quiz in as few LLM requests as possible
+answer_evaluator = AnswerEvaluator()
+
 class ReadingPassage(BaseModel):
     title: str
     content: str
     questions: List[dict]
     level: int
 
+class GeneratedPassage(BaseModel):
+    title: str
+    content: str
+    questions: List[dict]
+
 class ReadingResponse(BaseModel):
     passage_id: str
     answers: List[dict]
 
-@router.get("/generate-passage")
-async def generate_reading_passage(
-    level: int,
-    topic: Optional[str] = None,
-    db: Session = Depends(get_db)
-):
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    
+async def create_passage(level: int, topic: Optional[str] = None, priority: int = INTERACTIVE) -> dict:
+    """Generate and validate a new reading passage with GPT"""
     # Generate a reading passage based on user's level
     system_prompt = f"""Generate an English reading passage suitable for level {level}/30 (30 being highest).
     The passage should be challenging but comprehensible for this level.
@@ -44,16 +48,29 @@ async def generate_reading_passage(
     
     topic_context = f" The topic should be about {topic}." if topic else ""
     
-    response = await openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
+    # Request JSON mode and validate the generated passage
+    passage = await request_structured(
+        json_call([
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"Generate a passage{topic_context}"}
-        ]
+        ], priority=priority),
+        GeneratedPassage
     )
-    
-    # Parse and return the generated passage
-    passage_data = eval(response.choices[0].message.content)
+    return ReadingPassage(**passage.model_dump(), level=level).model_dump()
+
+# Serves pre-generated passages; create_passage refills it in the background
+passage_pool = PassagePool(lambda level, topic: create_passage(level, topic, priority=BACKGROUND))
+
+@router.get("/generate-passage")
+async def generate_reading_passage(
+    level: int = Query(..., ge=0, le=30),
+    topic: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    passage_data = await passage_pool.take(level, topic)
+    if passage_data is None:
+        # Pool miss: generate on demand
+        passage_data = await create_passage(level, topic)
     return ReadingPassage(**passage_data)
 
 @router.post("/evaluate")
@@ -61,24 +78,13 @@ async def evaluate_reading_response(
     response: ReadingResponse,
     db: Session = Depends(get_db)
 ):
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    
-    # Evaluate each answer
-    total_score = 0
-    feedback = []
-    
-    for answer in response.answers:
-        evaluation = await openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are an English reading assessment expert. Evaluate the answer and provide a score (0-1) and constructive feedback."},
-                {"role": "user", "content": f"Question: {answer['question']}\nStudent's Answer: {answer['answer']}"}
-            ]
-        )
-        
-        result = eval(evaluation.choices[0].message.content)
-        total_score += result["score"]
-        feedback.append(result["feedback"])
+    # Evaluate all answers together
+    results = await answer_evaluator.evaluate(
+        response.answers,
+        "You are an English reading assessment expert. Evaluate the answer and provide a score (0-1) and constructive feedback."
+    )
+    total_score = sum(result["score"] for result in results)
+    feedback = [result["feedback"] for result in results]
     
     # Calculate average score
     average_score = total_score / len(response.answers)
@@ -1,12 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, UploadFile, File, Request
-from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, WebSocket, UploadFile, File, Request, Response
+from typing import List, Optional, Dict
 from datetime import datetime
-from pydub import AudioSegment
+from collections import OrderedDict
+import asyncio
 import json
+import os
+import re
+import uuid
 
 from services.speech_service import SpeechService
 from services.llm_service import LLMService
-from models.speaking import SpeakingSession, SpeakingResponse, Message
+from services.audio_transcoder import audio_transcoder, TranscoderBusyError
+from services.recognizer_pool import RecognizerPool, RecognizerPoolFullError
+from services.history_manager import HistoryManager
+from services.session_store import SpeakingSessionStore, SessionNotFoundError
+from services.structured_output import request_structured, StructuredOutputError
+from services.llm_cache import LLMCache
+from models.speaking import SpeakingSession, SpeakingResponse, SpeakingGrade, Message
 from database import get_db
 from sqlalchemy.orm import Session
 from auth import get_current_user
@@ -18,6 +28,23 @@ router = APIRouter(
 # Initialize services
 speech_service = SpeechService()
 llm_service = LLMService()
+# Each speaking session gets its own recognizer instead of sharing speech_service's
+recognizer_pool = RecognizerPool(speech_service)
+# Bounds the history sent to the LLM on each turn
+history_manager = HistoryManager(llm_service)
+# Server-side conversation history, so clients can send just the session_id
+session_store = SpeakingSessionStore()
+
+# Timeouts (seconds) for the two independent LLM calls in /grade_and_respond.
+# If grading misses GRADE_TIMEOUT the reply is returned on its own and the
+# grade keeps running in the background until GRADE_HARD_TIMEOUT.
+REPLY_TIMEOUT = float(os.getenv("REPLY_TIMEOUT", "30"))
+GRADE_TIMEOUT = float(os.getenv("GRADE_TIMEOUT", "5"))
+GRADE_HARD_TIMEOUT = float(os.getenv("GRADE_HARD_TIMEOUT", "60"))
+MAX_PENDING_GRADES = int(os.getenv("MAX_PENDING_GRADES", "1000"))
+
+# Grading tasks whose results are delivered later via /grade/{grade_id}
+pending_grades: "OrderedDict[str, asyncio.Task]" = OrderedDict()
 
 @router.websocket("/ws/{session_id}")
 async def websocket_endpoint(
@@ -25,19 +52,43 @@ async def websocket_endpoint(
     session_id: str,
     current_user: dict = Depends(get_current_user)
 ):
-    """WebSocket endpoint for real-time speech recognition"""
+    """
+    WebSocket endpoint for real-time speech recognition.
+    After a start_recording action the client streams microphone audio as binary
+    frames; interim and final results come back as recognition messages.
+    """
     await websocket.accept()
     
+    try:
+        recognition = recognizer_pool.acquire(session_id)
+    except RecognizerPoolFullError as e:
+        await websocket.close(code=1013, reason=str(e))  # 1013: try again later
+        return
+    
     try:
         # Function to handle recognized speech
-        async def on_recognized(text: str):
-            await websocket.send_json({"type": "recognition", "text": text})
+        async def on_recognized(text: str, final: bool):
+            await websocket.send_json({"type": "recognition", "text": text, "final": final})
         
         while True:
-            data = await websocket.receive_json()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            
+            # Binary frames carry audio for the active recording
+            if message.get("bytes") is not None:
+                recognition.write(message["bytes"])
+                continue
+            
+            data = json.loads(message["text"])
+            recognition.touch()
             
             if data["action"] == "start_recording":
-                success = await speech_service.start_continuous_recognition(on_recognized)
+                success = await recognition.start(
+                    on_recognized,
+                    data.get("format", "pcm"),
+                    data.get("sample_rate", 16000)
+                )
                 await websocket.send_json({
                     "type": "status",
                     "success": success,
@@ -45,7 +96,7 @@ async def websocket_endpoint(
                 })
                 
             elif data["action"] == "stop_recording":
-                success = await speech_service.stop_continuous_recognition()
+                success = await recognition.stop()
                 await websocket.send_json({
                     "type": "status",
                     "success": success,
@@ -58,28 +109,162 @@ async def websocket_endpoint(
                 if not text:
                     continue
                 
+                history, system_prompt = history_manager.prepare(
+                    session_id,
+                    await load_history(session_id, data.get("conversation_history")),
+                    llm_service.get_speaking_prompt()
+                )
+                
+                if data.get("stream"):
+                    ai_response = await stream_ai_response(websocket, text, history, system_prompt)
+                    await record_turns(session_id, text, ai_response)
+                    continue
+                
                 # Get AI response
                 ai_response = await llm_service.get_response(
                     text,
-                    data.get("conversation_history", []),
-                    llm_service.get_speaking_prompt()
+                    history,
+                    system_prompt,
+                    hedge=True
                 )
                 
-                # Synthesize and send response
-                speech_success = await speech_service.synthesize_speech(ai_response)
+                # Synthesize and stream the audio to the client
+                speech_success = await send_speech(websocket, ai_response)
                 
                 await websocket.send_json({
                     "type": "ai_response",
                     "text": ai_response,
                     "success": speech_success
                 })
+                await record_turns(session_id, text, ai_response)
     
     except Exception as e:
         await websocket.close()
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        await recognizer_pool.release(recognition)
+
+def normalize_history(client_history: List[dict]) -> List[dict]:
+    """
+    Convert client history entries to {role, content} messages.
+    The web client sends {role, text} with role "ai"; entries without text are skipped.
+    """
+    messages = []
+    for entry in client_history:
+        if not isinstance(entry, dict):
+            continue
+        content = entry.get("content", entry.get("text"))
+        if not isinstance(content, str) or not content:
+            continue
+        messages.append({"role": "user" if entry.get("role") == "user" else "assistant", "content": content})
+    return messages
+
+async def load_history(session_id: Optional[str], client_history: Optional[List[dict]]) -> List[dict]:
+    """Use the history the client sent, otherwise the server-side copy for the session"""
+    if client_history is not None or not session_id:
+        return normalize_history(client_history or [])
+    try:
+        return await session_store.history(session_id)
+    except SessionNotFoundError:
+        return []
+
+async def record_turns(session_id: Optional[str], user_text: str, ai_response: str):
+    """Append a completed exchange to the stored session, if there is one"""
+    if not session_id:
+        return
+    try:
+        await session_store.append(session_id, [
+            Message(role="user", content=user_text),
+            Message(role="assistant", content=ai_response)
+        ])
+    except SessionNotFoundError:
+        pass
+
+async def send_speech(websocket: WebSocket, text: str) -> bool:
+    """
+    Synthesize text and forward the audio as binary WebSocket frames while it is generated.
+    The frames are bracketed by ai_audio_start and ai_audio_end JSON messages.
+    """
+    await websocket.send_json({
+        "type": "ai_audio_start",
+        "text": text,
+        "format": speech_service.audio_mime_type
+    })
+    success = True
+    try:
+        async for chunk in speech_service.stream_audio(text):
+            await websocket.send_bytes(chunk)
+    except Exception as e:
+        # Any synthesis failure ends this audio message, not the WebSocket
+        print(f"Error streaming speech: {e}")
+        await websocket.send_json({"type": "error", "success": False, "message": "Speech synthesis failed"})
+        success = False
+    await websocket.send_json({"type": "ai_audio_end", "success": success})
+    return success
+
+# A sentence is complete once terminal punctuation is followed by whitespace
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+
+def split_sentences(buffer: str) -> tuple[List[str], str]:
+    """Split buffered text into complete sentences and the unfinished remainder"""
+    parts = SENTENCE_BOUNDARY.split(buffer)
+    return [p for p in parts[:-1] if p.strip()], parts[-1]
+
+async def stream_ai_response(websocket: WebSocket,
+                             text: str,
+                             conversation_history: List[dict],
+                             system_prompt: Optional[str]) -> str:
+    """
+    Stream the AI reply over the WebSocket as ai_response_delta frames and
+    synthesize each sentence as soon as it is complete, instead of waiting
+    for the whole reply before starting speech.
+    """
+    sentences: asyncio.Queue = asyncio.Queue()
+    
+    async def speak_sentences():
+        all_spoken = True
+        while True:
+            sentence = await sentences.get()
+            if sentence is None:
+                return all_spoken
+            success = await send_speech(websocket, sentence)
+            all_spoken = all_spoken and success
+    
+    speaker = asyncio.create_task(speak_sentences())
+    full_text = ""
+    buffer = ""
+    try:
+        async for delta in llm_service.stream_response(
+            text,
+            conversation_history,
+            system_prompt
+        ):
+            full_text += delta
+            buffer += delta
+            await websocket.send_json({"type": "ai_response_delta", "text": delta})
+            
+            complete, buffer = split_sentences(buffer)
+            for sentence in complete:
+                sentences.put_nowait(sentence.strip())
+        
+        if buffer.strip():
+            sentences.put_nowait(buffer.strip())
+        sentences.put_nowait(None)
+        speech_success = await speaker
+    except Exception:
+        speaker.cancel()
+        raise
+    
+    await websocket.send_json({
+        "type": "ai_response",
+        "text": full_text,
+        "success": speech_success
+    })
+    return full_text
 
 @router.post("/start", response_model=SpeakingSession)
 async def start_speaking_session(
+    background_tasks: BackgroundTasks,
     topic: Optional[str] = None,
     difficulty: Optional[str] = None,
     db: Session = Depends(get_db),
@@ -105,37 +290,61 @@ async def start_speaking_session(
         )
         
         # Store session in database
-        # TODO: Implement database storage
+        session = await session_store.create(session)
         
-        # Synthesize welcome message
-        await speech_service.synthesize_speech(welcome_msg)
+        # Pre-synthesize the welcome message after responding so /synthesize serves it from cache
+        background_tasks.add_task(speech_service.synthesize_speech, welcome_msg)
         
         return session
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/synthesize")
+async def synthesize(request: Request):
+    """Return synthesized audio for a piece of tutor text (served from cache when possible)"""
+    data = await request.json()
+    text = data.get("text", "")
+    if not text:
+        raise HTTPException(status_code=400, detail="No text to synthesize")
+    audio = await speech_service.synthesize_audio(text)
+    if audio is None:
+        raise HTTPException(status_code=502, detail="Speech synthesis failed")
+    return Response(content=audio, media_type=speech_service.audio_mime_type)
+
 @router.post("/{session_id}/end")
 async def end_speaking_session(
     session_id: str,
-    conversation_history: List[dict],
+    background_tasks: BackgroundTasks,
+    conversation_history: Optional[List[dict]] = None,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """End the speaking session and get final feedback"""
     try:
+        conversation_history = await load_history(session_id, conversation_history)
+        
         # Get final feedback from AI
         feedback_prompt = "Please provide feedback on the student's English speaking skills based on our conversation. Include strengths and areas for improvement."
-        feedback = await llm_service.get_response(
-            feedback_prompt,
+        history, system_prompt = history_manager.prepare(
+            session_id,
             conversation_history,
             llm_service.get_speaking_prompt()
         )
+        feedback = await llm_service.get_response(
+            feedback_prompt,
+            history,
+            system_prompt
+        )
+        history_manager.forget(session_id)
         
         # Store feedback in database
-        # TODO: Implement database storage
+        try:
+            await session_store.end(session_id, feedback)
+        except SessionNotFoundError:
+            pass
         
-        # Synthesize feedback
-        await speech_service.synthesize_speech(feedback)
+        # Pre-synthesize feedback after responding so /synthesize serves it from cache
+        background_tasks.add_task(speech_service.synthesize_speech, feedback)
         
         return {
             "message": "Session ended",
@@ -144,50 +353,33 @@ async def end_speaking_session(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Recognition input format: 16 kHz, 16-bit, mono PCM
+TRANSCRIBE_SAMPLE_RATE = 16000
+
 @router.post("/transcribe")
 async def transcribe_audio(audio: UploadFile = File(...)):
     print("/transcribe endpoint called")
     contents = await audio.read()
-    temp_path = "temp_audio.webm"
-    wav_path = "temp_audio.wav"
-    with open(temp_path, "wb") as f:
-        f.write(contents)
-    print(f"Audio file saved to {temp_path}")
-    # Convert webm to wav
+    # Decode the upload in memory and hand raw PCM to Azure, so concurrent
+    # requests never share (or overwrite) temporary audio files.
+    # Decoding is CPU-bound, so it runs on the shared transcoding process pool.
     try:
-        print("Converting audio to wav format...")
-        sound = AudioSegment.from_file(temp_path)
-        sound.export(wav_path, format="wav")
-        print(f"Audio converted to {wav_path}")
-        text, success = await speech_service.recognize_speech_from_file(wav_path)
+        print("Decoding audio to PCM...")
+        pcm = await audio_transcoder.to_pcm(contents, TRANSCRIBE_SAMPLE_RATE)
+        text, success = await speech_service.recognize_speech_from_pcm(
+            pcm,
+            TRANSCRIBE_SAMPLE_RATE
+        )
         print("Transcription result:", text, success)
+    except TranscoderBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         print(f"Audio conversion error: {e}")
         return {"text": "", "success": False}
     return {"text": text, "success": success}
 
-@router.post("/grade_and_respond")
-async def grade_and_respond(request: Request):
-    print("/grade_and_respond endpoint called")
-    data = await request.json()
-    message = data.get('message', '')
-    history = data.get('history', [])
-    print("Received message:", message)
-    print("Received history:", history)
-
-    # 1. Get LLM response (as before)
-    try:
-        ai_response = await llm_service.get_response(
-            message,
-            history,
-            llm_service.get_speaking_prompt()
-        )
-        print("AI conversation response:", ai_response)
-    except Exception as e:
-        print("Error getting AI response:", e)
-        return { 'response': '', 'feedback': {'error': str(e)} }
-
-    # 2. Grade the user's message using Cohere LLM
+async def grade_message(message: str) -> Dict:
+    """Grade a single user message using the Cohere LLM and return the parsed feedback"""
     grading_prompt = (
         "You are an IELTS speaking examiner. "
         "Grade the following response. "
@@ -196,24 +388,115 @@ async def grade_and_respond(request: Request):
         f"Response: \"{message}\""
     )
     print("Grading prompt:", grading_prompt)
-    try:
+
+    async def ask_grader(correction: Optional[str]) -> str:
+        prompt = grading_prompt if correction is None else f"{grading_prompt}\n\n{correction}"
         grading_response = await llm_service.get_response(
-            grading_prompt,
+            prompt,
             [],
             None  # No system prompt needed for grading
         )
         print("LLM grading response:", grading_response)
+        return grading_response
+
+    # Parse and validate the grading response, asking once for a correction if needed
+    try:
+        grade = await asyncio.wait_for(
+            request_structured(
+                ask_grader,
+                SpeakingGrade,
+                cache_key=LLMCache.make_key("speaking_grade", message, casefold=True)
+            ),
+            GRADE_HARD_TIMEOUT
+        )
+    except asyncio.TimeoutError:
+        print("Grading timed out")
+        return {'error': "Grading timed out"}
+    except StructuredOutputError as e:
+        print("Error parsing grading response:", e)
+        return {'error': str(e)}
     except Exception as e:
         print("Error getting grading response:", e)
-        return { 'response': ai_response, 'feedback': {'error': str(e)} }
+        return {'error': str(e)}
 
-    # 3. Parse the grading_response as JSON
+    feedback = grade.model_dump()
+    print("Parsed feedback:", feedback)
+    return feedback
+
+def defer_grade(task: asyncio.Task) -> str:
+    """Keep a still-running grading task so the client can collect it later"""
+    grade_id = str(uuid.uuid4())
+    pending_grades[grade_id] = task
+    while len(pending_grades) > MAX_PENDING_GRADES:
+        _, oldest = pending_grades.popitem(last=False)
+        oldest.cancel()
+    return grade_id
+
+@router.post("/grade_and_respond")
+async def grade_and_respond(request: Request):
+    print("/grade_and_respond endpoint called")
+    data = await request.json()
+    message = data.get('message', '')
+    session_id = data.get('session_id')
+    history = await load_history(session_id, data.get('history'))
+    print("Received message:", message)
+    print("Received history:", history)
+
+    # Only a bounded window of the history (plus a rolling summary) is sent
+    history, system_prompt = history_manager.prepare(
+        HistoryManager.conversation_key(history, session_id),
+        history,
+        llm_service.get_speaking_prompt()
+    )
+
+    # 1. Start the conversation reply and the grading concurrently
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    reply_task = asyncio.create_task(asyncio.wait_for(
+        llm_service.get_response(
+            message,
+            history,
+            system_prompt,
+            hedge=True
+        ),
+        REPLY_TIMEOUT
+    ))
+    grade_task = asyncio.create_task(grade_message(message))
+
+    # 2. The reply is required; without it there is nothing to return
     try:
-        feedback = json.loads(grading_response)
-        print("Parsed feedback:", feedback)
+        ai_response = await reply_task
+        print("AI conversation response:", ai_response)
     except Exception as e:
-        print("Error parsing grading response as JSON:", e)
-        feedback = {"raw_feedback": grading_response, "error": str(e)}
+        print("Error getting AI response:", e)
+        grade_task.cancel()
+        error = "Conversation reply timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+        return { 'response': '', 'feedback': {'error': error} }
+
+    # 3. Wait for grading only for what is left of its own budget.
+    # shield() keeps the task alive when we stop waiting for it.
+    remaining = max(0.0, GRADE_TIMEOUT - (loop.time() - started))
+    try:
+        feedback = await asyncio.wait_for(asyncio.shield(grade_task), remaining)
+    except asyncio.TimeoutError:
+        grade_id = defer_grade(grade_task)
+        print("Grading still running, deferred as", grade_id)
+        feedback = {'pending': True, 'grade_id': grade_id}
+
+    await record_turns(session_id, message, ai_response)
 
     # 4. Return both
-    return { 'response': ai_response, 'feedback': feedback } 
\ No newline at end of file
+    return { 'response': ai_response, 'feedback': feedback }
+
+@router.get("/grade/{grade_id}")
+async def get_deferred_grade(grade_id: str):
+    """Collect the feedback for a grade that was still running when its reply was returned"""
+    task = pending_grades.get(grade_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired grade id")
+    if not task.done():
+        return {'pending': True, 'grade_id': grade_id}
+    pending_grades.pop(grade_id, None)
+    if task.cancelled():
+        return {'pending': False, 'feedback': {'error': "Grading was cancelled"}}
+    return {'pending': False, 'feedback': task.result()}
\ No newline at end of file
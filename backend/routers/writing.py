@@ -2,10 +2,11 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel
-import openai
-import os
 from ..database import get_db
 from ..models import User, ProgressRecord
+from ..services.structured_output import request_structured, json_call, schema_instructions
+from ..services.llm_cache import LLMCache
+from ..services.llm_gateway import llm_gateway
 
 router = APIRouter()
 
@@ -25,10 +26,12 @@ class WritingFeedback(BaseModel):
     corrections: List[dict]
     suggestions: List[str]
 
+class RealTimeFeedback(BaseModel):
+    corrections: List[dict]
+    suggestions: List[str]
+
 @router.post("/generate-prompt")
 async def generate_writing_prompt(prompt_request: WritingPrompt):
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    
     system_prompt = f"""Generate a writing prompt for an English learner at level {prompt_request.level}/30.
     Type: {prompt_request.type}
     Topic: {prompt_request.topic}
@@ -40,15 +43,10 @@ async def generate_writing_prompt(prompt_request: WritingPrompt):
     4. Useful vocabulary and phrases
     5. Assessment criteria"""
     
-    response = await openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": "Generate a writing prompt"}
-        ]
-    )
-    
-    return response.choices[0].message.content
+    return await llm_gateway.chat([
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": "Generate a writing prompt"}
+    ])
 
 @router.post("/real-time-feedback")
 async def get_real_time_feedback(
@@ -56,8 +54,6 @@ async def get_real_time_feedback(
     previous_feedback: Optional[List[dict]] = None
 ):
     """Provide real-time feedback as the user writes"""
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    
     # Only analyze the most recent addition if previous feedback exists
     text_to_analyze = text
     if previous_feedback:
@@ -65,9 +61,8 @@ async def get_real_time_feedback(
         last_analyzed_position = max(f["position"] for f in previous_feedback)
         text_to_analyze = text[last_analyzed_position:]
     
-    response = await openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
+    feedback = await request_structured(
+        json_call([
             {"role": "system", "content": """Analyze the following text in real-time and provide immediate feedback on:
             1. Grammar errors
             2. Vocabulary suggestions
@@ -78,10 +73,10 @@ async def get_real_time_feedback(
             - corrections: array of {position, original, suggestion, type}
             - suggestions: array of improvement suggestions"""},
             {"role": "user", "content": text_to_analyze}
-        ]
+        ]),
+        RealTimeFeedback,
+        cache_key=LLMCache.make_key("writing_realtime", text_to_analyze)
     )
-    
-    feedback = response.choices[0].message.content
     return feedback
 
 @router.post("/evaluate")
@@ -91,11 +86,8 @@ async def evaluate_writing(
     db: Session = Depends(get_db)
 ):
     """Provide comprehensive evaluation of completed writing"""
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    
-    response = await openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
+    feedback = await request_structured(
+        json_call([
             {"role": "system", "content": f"""Evaluate the following {prompt_type} based on:
             1. Grammar and mechanics
             2. Vocabulary usage
@@ -109,27 +101,27 @@ async def evaluate_writing(
             - Improvement suggestions
             - Overall feedback
             
-            Format response as JSON."""},
+            """ + schema_instructions(WritingFeedback)},
             {"role": "user", "content": text}
-        ]
+        ]),
+        WritingFeedback,
+        cache_key=LLMCache.make_key("writing_evaluation", prompt_type, text)
     )
     
-    feedback_data = eval(response.choices[0].message.content)
-    
     # Store progress record
     progress_record = ProgressRecord(
         user_id=1,  # Replace with actual user ID from auth
         activity_type="writing",
-        score=feedback_data["overall_score"],
+        score=feedback.overall_score,
         metadata={
             "text": text,
-            "feedback": feedback_data
+            "feedback": feedback.model_dump()
         }
     )
     db.add(progress_record)
     db.commit()
     
-    return WritingFeedback(**feedback_data)
+    return feedback
 
 @router.post("/suggest-improvements")
 async def suggest_improvements(
@@ -137,8 +129,6 @@ async def suggest_improvements(
     aspect: str  # "vocabulary", "grammar", "structure", "style"
 ):
     """Get specific suggestions for improving different aspects of writing"""
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-    
     prompts = {
         "vocabulary": "Suggest more sophisticated vocabulary alternatives for basic words in the text",
         "grammar": "Identify grammar issues and suggest corrections",
@@ -146,15 +136,12 @@ async def suggest_improvements(
         "style": "Suggest improvements for writing style and tone"
     }
     
-    response = await openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {"role": "system", "content": prompts[aspect]},
-            {"role": "user", "content": text}
-        ]
-    )
+    suggestions = await llm_gateway.chat([
+        {"role": "system", "content": prompts[aspect]},
+        {"role": "user", "content": text}
+    ])
     
     return {
         "aspect": aspect,
-        "suggestions": response.choices[0].message.content
+        "suggestions": suggestions
     } 
\ No newline at end of file
@@ -0,0 +1,142 @@
+import os
+import asyncio
+from typing import List, Dict
+from pydantic import BaseModel, Field
+from .local_grader import grade_locally
+from .structured_output import request_structured, json_call, schema_instructions, parse_model, StructuredOutputError
+from .llm_cache import llm_cache, LLMCache
+
+class AnswerResult(BaseModel):
+    index: int = 0
+    score: float = Field(ge=0, le=1)
+    feedback: str
+
+class BatchEvaluation(BaseModel):
+    results: List[AnswerResult]
+
+class AnswerEvaluator:
+    def __init__(self):
+        """
+        Grade a set of quiz answers with as few LLM round trips as possible.
+        Multiple-choice and short exact answers are graded locally, and the rest
+        are graded together in one structured request. Sets that are too large
+        are split into batches that run concurrently.
+        """
+        self.batch_size = int(os.getenv("EVAL_BATCH_SIZE", "10"))
+        self.batch_max_chars = int(os.getenv("EVAL_BATCH_MAX_CHARS", "12000"))
+        self.max_concurrency = int(os.getenv("EVAL_MAX_CONCURRENCY", "4"))
+    
+    @staticmethod
+    def _format_answer(index: int, answer: dict) -> str:
+        text = f"[{index}] Question: {answer['question']}\nStudent's Answer: {answer['answer']}"
+        if answer.get("correct_answer"):
+            text += f"\nCorrect Answer: {answer['correct_answer']}"
+        return text
+    
+    def _batches(self, answers: List[dict], indexes: List[int]) -> List[List[int]]:
+        """Group answer indexes into batches bounded by count and prompt size"""
+        batches, current, size = [], [], 0
+        for i in indexes:
+            cost = len(self._format_answer(i, answers[i]))
+            if current and (len(current) >= self.batch_size or size + cost > self.batch_max_chars):
+                batches.append(current)
+                current, size = [], 0
+            current.append(i)
+            size += cost
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _messages(self, system_prompt: str, user_prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    async def _evaluate_batch(self, answers: List[dict], indexes: List[int], instructions: str) -> Dict[int, dict]:
+        """Grade several answers in a single request"""
+        system_prompt = (
+            f"{instructions}\n"
+            "You will receive several numbered answers. Grade each one independently with a score "
+            "between 0 and 1 and short, constructive feedback, using the answer's number as its index. "
+            + schema_instructions(BatchEvaluation)
+        )
+        user_prompt = "\n\n".join(self._format_answer(i, answers[i]) for i in indexes)
+        evaluation = await request_structured(
+            json_call(self._messages(system_prompt, user_prompt)),
+            BatchEvaluation
+        )
+        
+        results = {r.index: {"score": r.score, "feedback": r.feedback} for r in evaluation.results}
+        if set(results) != set(indexes):
+            raise ValueError("Batch evaluation did not return a result for every answer")
+        return results
+    
+    async def _evaluate_single(self, answer: dict, instructions: str) -> dict:
+        """Grade one answer on its own (used when a batch reply is unusable)"""
+        system_prompt = f"{instructions}\n" + schema_instructions(AnswerResult)
+        result = await request_structured(
+            json_call(self._messages(system_prompt, self._format_answer(0, answer))),
+            AnswerResult
+        )
+        return {"score": result.score, "feedback": result.feedback}
+    
+    async def evaluate(self, answers: List[dict], instructions: str) -> List[dict]:
+        """
+        Grade all answers and return one {"score", "feedback"} dict per answer, in order.
+        Args:
+            answers: Dicts with question, answer and optionally correct_answer
+            instructions: What the grader should look for
+        """
+        # Deterministic grading first; only genuinely open answers reach the LLM
+        graded: Dict[int, dict] = {}
+        for i, answer in enumerate(answers):
+            result = grade_locally(answer)
+            if result is not None:
+                graded[i] = result
+        
+        # Then previously graded identical answers
+        cache_keys = {
+            i: LLMCache.make_key(
+                "answer",
+                instructions,
+                answer.get("question", ""),
+                answer.get("answer", ""),
+                answer.get("correct_answer", ""),
+                casefold=True
+            )
+            for i, answer in enumerate(answers) if i not in graded
+        }
+        for i, key in cache_keys.items():
+            cached = await llm_cache.get(key)
+            if cached is not None:
+                try:
+                    result = parse_model(cached, AnswerResult)
+                except StructuredOutputError:
+                    continue  # Stale entry from an older schema; regrade and overwrite it
+                graded[i] = {"score": result.score, "feedback": result.feedback}
+        
+        pending = [i for i in range(len(answers)) if i not in graded]
+        if not pending:
+            return [graded[i] for i in range(len(answers))]
+        
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def run_batch(indexes: List[int]) -> Dict[int, dict]:
+            async with semaphore:
+                try:
+                    return await self._evaluate_batch(answers, indexes, instructions)
+                except Exception as e:
+                    print(f"Batch evaluation failed, grading answers one by one: {e}")
+            
+            async def run_single(i: int):
+                async with semaphore:
+                    return i, await self._evaluate_single(answers[i], instructions)
+            
+            return dict(await asyncio.gather(*(run_single(i) for i in indexes)))
+        
+        for batch_results in await asyncio.gather(*(run_batch(b) for b in self._batches(answers, pending))):
+            graded.update(batch_results)
+            for i, result in batch_results.items():
+                await llm_cache.set(cache_keys[i], AnswerResult(index=i, **result).model_dump_json())
+        return [graded[i] for i in range(len(answers))]
@@ -0,0 +1,72 @@
+import os
+import io
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict
+from pydub import AudioSegment
+
+class TranscoderBusyError(Exception):
+    """Raised when the transcoding queue is full and the request should be retried later"""
+    pass
+
+def decode_to_pcm(data: bytes, sample_rate: int) -> bytes:
+    """
+    Decode compressed audio (webm, ogg, mp3, ...) to 16-bit mono PCM.
+    Runs inside a worker process, so it must stay a module-level function.
+    """
+    sound = AudioSegment.from_file(io.BytesIO(data))
+    sound = sound.set_frame_rate(sample_rate).set_channels(1).set_sample_width(2)
+    return sound.raw_data
+
+class AudioTranscoder:
+    def __init__(self):
+        """Initialize the transcoding stage; worker processes start on first use"""
+        self.max_workers = int(os.getenv("TRANSCODER_WORKERS", str(os.cpu_count() or 2)))
+        # Jobs allowed to wait for a free worker before new ones are rejected
+        self.max_queue = int(os.getenv("TRANSCODER_MAX_QUEUE", "32"))
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self.executor
+    
+    async def to_pcm(self, data: bytes, sample_rate: int = 16000) -> bytes:
+        """
+        Decode audio to PCM on the process pool.
+        Raises TranscoderBusyError when every worker is busy and the queue is full.
+        """
+        if self._in_flight >= self.max_workers + self.max_queue:
+            self._rejected += 1
+            raise TranscoderBusyError("Audio transcoding queue is full")
+        
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), decode_to_pcm, data, sample_rate)
+        finally:
+            self._in_flight -= 1
+            self._completed += 1
+    
+    def stats(self) -> Dict[str, int]:
+        """Queue depth metrics for the transcoding stage"""
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "queued": max(0, self._in_flight - self.max_workers),
+            "completed": self._completed,
+            "rejected": self._rejected
+        }
+    
+    def close(self):
+        """Shut down the worker processes"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+# Shared by every endpoint that needs to decode uploaded audio
+audio_transcoder = AudioTranscoder()
@@ -0,0 +1,125 @@
+import os
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import List, Dict, Optional, Tuple
+from .llm_service import LLMService
+from .rate_limiter import BACKGROUND
+
+class HistoryManager:
+    def __init__(self, llm_service: LLMService):
+        """
+        Keep the prompt for each conversation turn bounded.
+        Recent turns are sent verbatim inside a token budget; older turns are
+        folded into a rolling summary that is updated in the background.
+        """
+        self.llm_service = llm_service
+        self.token_budget = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+        # Summarise once this many turns have fallen out of the window
+        self.summary_batch = int(os.getenv("HISTORY_SUMMARY_BATCH", "4"))
+        self.max_conversations = int(os.getenv("HISTORY_MAX_CONVERSATIONS", "1000"))
+        # conversation key -> (number of leading turns summarised, hash of those turns, summary text)
+        self._summaries: "OrderedDict[str, Tuple[int, str, str]]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+    
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Cheap token estimate (roughly four characters per token)"""
+        return len(text) // 4 + 1
+    
+    @staticmethod
+    def conversation_key(history: List[Dict[str, str]], session_id: Optional[str] = None) -> str:
+        """Identify a conversation by session id, or by its opening message when there is none"""
+        if session_id:
+            return session_id
+        opening = history[0]["content"] if history else ""
+        return hashlib.sha1(opening.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def prefix_hash(turns: List[Dict[str, str]]) -> str:
+        """Fingerprint of the turns a summary was built from"""
+        digest = hashlib.sha1()
+        for message in turns:
+            digest.update(f"{message['role']}\x00{message['content']}\x00".encode("utf-8"))
+        return digest.hexdigest()
+    
+    def _window_start(self, history: List[Dict[str, str]]) -> int:
+        """Index of the oldest turn that still fits in the token budget (the last turn always fits)"""
+        used = 0
+        start = len(history)
+        while start > 0:
+            cost = self.estimate_tokens(history[start - 1]["content"])
+            if used + cost > self.token_budget and start < len(history):
+                break
+            used += cost
+            start -= 1
+        return start
+    
+    def prepare(self,
+                key: str,
+                history: List[Dict[str, str]],
+                system_prompt: Optional[str]) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """
+        Return the (history window, system prompt) to send for this turn.
+        Never waits on the LLM: the latest available summary is used and a
+        newer one is scheduled if enough turns have fallen out of the window.
+        """
+        split = self._window_start(history)
+        summarised, summarised_hash, summary = self._summaries.get(key, (0, "", ""))
+        if key in self._summaries:
+            self._summaries.move_to_end(key)
+        if summarised > split or self.prefix_hash(history[:summarised]) != summarised_hash:
+            # A shorter or different history than we summarised: conversations without a
+            # session id can share a key, so never reuse another conversation's summary
+            summarised, summary = 0, ""
+        
+        if split - summarised >= self.summary_batch and key not in self._pending:
+            self._schedule_summary(key, history[:split], summarised, summary)
+        
+        # Turns not yet covered by the summary stay verbatim while it catches up,
+        # as long as that keeps the prompt within twice the budget
+        catch_up = history[summarised:split]
+        catch_up_tokens = sum(self.estimate_tokens(m["content"]) for m in catch_up)
+        start = summarised if catch_up_tokens <= self.token_budget else split
+        window = history[start:]
+        
+        if summary:
+            summary_prompt = f"Summary of the earlier conversation:\n{summary}"
+            system_prompt = f"{system_prompt}\n\n{summary_prompt}" if system_prompt else summary_prompt
+        return window, system_prompt
+    
+    def _schedule_summary(self, key: str, older: List[Dict[str, str]], summarised: int, summary: str):
+        task = asyncio.create_task(self._summarise(key, older, summarised, summary))
+        self._pending[key] = task
+        task.add_done_callback(lambda _: self._pending.pop(key, None))
+    
+    async def _summarise(self, key: str, older: List[Dict[str, str]], summarised: int, summary: str):
+        """Fold newly dropped turns into the existing summary"""
+        new_turns = "\n".join(
+            f"{'Student' if m['role'] == 'user' else 'Tutor'}: {m['content']}"
+            for m in older[summarised:]
+        )
+        prompt = (
+            "Update the summary of an English speaking practice session between a tutor and a student. "
+            "Keep the topics discussed, the student's recurring mistakes and any scores given. "
+            "Reply with the updated summary only, in at most 150 words.\n\n"
+            f"Current summary:\n{summary or '(none)'}\n\n"
+            f"New turns:\n{new_turns}"
+        )
+        try:
+            updated = await self.llm_service.get_response(prompt, [], None, priority=BACKGROUND)
+        except Exception as e:
+            print(f"Error summarising conversation history: {e}")
+            return
+        
+        self._summaries[key] = (len(older), self.prefix_hash(older), updated.strip())
+        self._summaries.move_to_end(key)
+        while len(self._summaries) > self.max_conversations:
+            self._summaries.popitem(last=False)
+    
+    def forget(self, key: str):
+        """Drop the summary for a finished conversation"""
+        self._summaries.pop(key, None)
+        task = self._pending.pop(key, None)
+        if task is not None:
+            task.cancel()
@@ -0,0 +1,228 @@
+import os
+import re
+import time
+import asyncio
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy.orm import selectinload
+from ..database import SessionLocal, engine
+from ..models.listening import ListeningVideoRecord, ListeningVideoTopic
+from .passage_pool import LEVEL_BANDS, level_band
+from .youtube_client import YouTubeClient
+
+# Search terms the crawler uses for each level band
+BAND_QUERIES = {
+    "basic": "basic english listening",
+    "intermediate": "intermediate english listening",
+    "advanced": "advanced english listening",
+}
+
+# YouTube's search.list videoDuration buckets in seconds (upper bound exclusive)
+YOUTUBE_DURATIONS = [
+    ("short", 0, 4 * 60),
+    ("medium", 4 * 60, 20 * 60),
+    ("long", 20 * 60, None),
+]
+
+_ISO_DURATION = re.compile(
+    r"^P(?:(?P<days>\d+)D)?(?:T(?:(?P<hours>\d+)H)?(?:(?P<minutes>\d+)M)?(?:(?P<seconds>\d+(?:\.\d+)?)S)?)?$"
+)
+
+def parse_iso_duration(value: str) -> int:
+    """Convert an ISO 8601 duration such as PT1H2M3S (as returned by videos.list) to seconds"""
+    match = _ISO_DURATION.match(value or "")
+    if match is None:
+        raise ValueError(f"Invalid ISO 8601 duration: {value!r}")
+    parts = {name: float(amount) for name, amount in match.groupdict().items() if amount}
+    return int(
+        parts.get("days", 0) * 86400
+        + parts.get("hours", 0) * 3600
+        + parts.get("minutes", 0) * 60
+        + parts.get("seconds", 0)
+    )
+
+def normalize_topic(topic: str) -> str:
+    return " ".join(topic.lower().split())
+
+def youtube_duration_filter(duration_range: Optional[Tuple[int, int]]) -> str:
+    """Return the videoDuration bucket that covers a (min, max) range in seconds, or "any" """
+    if duration_range is None:
+        return "any"
+    low, high = duration_range
+    for name, bucket_low, bucket_high in YOUTUBE_DURATIONS:
+        if low >= bucket_low and (bucket_high is None or high < bucket_high):
+            return name
+    return "any"
+
+class ListeningCatalog:
+    def __init__(self, client: YouTubeClient, on_ingest: Optional[Callable[[List[Tuple[str, str]]], None]] = None):
+        """
+        Local catalog of captioned YouTube videos indexed by level band and topic.
+        Recommendations are a database query; a background crawler refreshes the
+        catalog, and a band/topic with no videos yet is crawled on demand, at most
+        once per cooldown. Only the configured topics are crawled.
+        Args:
+            client: YouTube Data API client
+            on_ingest: Optional callback receiving (video_id, level_band) for newly catalogued videos
+        """
+        self.client = client
+        self.on_ingest = on_ingest
+        self.refresh_interval = float(os.getenv("LISTENING_CATALOG_REFRESH_HOURS", "24")) * 3600
+        # An empty on-demand crawl is not retried for this long, so empty results stay cheap
+        self.crawl_cooldown = float(os.getenv("LISTENING_CATALOG_CRAWL_COOLDOWN_MINUTES", "60")) * 60
+        self.videos_per_query = int(os.getenv("LISTENING_CATALOG_VIDEOS_PER_QUERY", "25"))
+        # Topics crawled for every band; "" is the general (no topic) query
+        self.topics: List[str] = [""] + [
+            normalize_topic(t) for t in os.getenv(
+                "LISTENING_CATALOG_TOPICS", "daily life,travel,business,science,culture"
+            ).split(",") if t.strip()
+        ]
+        self._crawler: Optional[asyncio.Task] = None
+        self._crawls: Dict[tuple, asyncio.Task] = {}
+        # Monotonic time of the last crawl per (band, topics, videoDuration bucket)
+        self._last_crawl: Dict[tuple, float] = {}
+
+    def start(self):
+        """Create the catalog tables and start the background crawler"""
+        if self._crawler is not None:
+            return
+        ListeningVideoRecord.__table__.create(bind=engine, checkfirst=True)
+        ListeningVideoTopic.__table__.create(bind=engine, checkfirst=True)
+        self._crawler = asyncio.create_task(self._crawl_forever())
+
+    async def _crawl_forever(self):
+        while True:
+            for _, _, band in LEVEL_BANDS:
+                for topic in self.topics:
+                    await self.crawl(band, [topic] if topic else [], "any")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def crawl(self, band: str, topics: List[str], video_duration: str = "any"):
+        """Search YouTube for one band, topic set and videoDuration bucket and upsert the results"""
+        key = (band, tuple(topics), video_duration)
+        if key not in self._crawls:
+            task = asyncio.create_task(self._crawl(band, topics, video_duration))
+            self._crawls[key] = task
+            task.add_done_callback(lambda _: self._crawls.pop(key, None))
+            self._record_crawl(key)
+        # Concurrent requests for the same band/topics share one crawl
+        await asyncio.shield(self._crawls[key])
+
+    def _record_crawl(self, key: tuple):
+        now = time.monotonic()
+        # Drop expired entries so arbitrary topic sets don't accumulate
+        for expired in [k for k, at in self._last_crawl.items() if now - at >= self.crawl_cooldown]:
+            del self._last_crawl[expired]
+        self._last_crawl[key] = now
+
+    def _crawled_recently(self, key: tuple) -> bool:
+        crawled_at = self._last_crawl.get(key)
+        return crawled_at is not None and time.monotonic() - crawled_at < self.crawl_cooldown
+
+    async def _crawl(self, band: str, topics: List[str], video_duration: str):
+        query = " ".join([BAND_QUERIES[band]] + topics)
+        try:
+            results = await self.client.search_videos(
+                query,
+                max_results=self.videos_per_query,
+                videoCaption="closedCaption",  # Only videos with captions
+                videoDuration=video_duration
+            )
+            added = await asyncio.to_thread(self._upsert, band, topics, results)
+            if added and self.on_ingest is not None:
+                self.on_ingest([(video_id, band) for video_id in added])
+        except Exception as e:
+            print(f"Error crawling listening catalog {band}/{' '.join(topics) or 'general'}: {e}")
+
+    def _upsert(self, band: str, topics: List[str], results: List[dict]) -> List[str]:
+        """Insert or refresh crawled videos; returns the ids of captioned videos that are new"""
+        added = []
+        db = SessionLocal()
+        try:
+            for item in results:
+                details = item["details"]
+                try:
+                    duration = parse_iso_duration(details["contentDetails"].get("duration", ""))
+                except ValueError:
+                    continue
+                if duration == 0:
+                    # Live streams and premieres report P0D
+                    continue
+                video_id = item["id"]["videoId"]
+                record = db.get(ListeningVideoRecord, video_id)
+                if record is None:
+                    # A video keeps the band it was first catalogued under, even if another band's crawl finds it
+                    record = ListeningVideoRecord(video_id=video_id, level_band=band)
+                    if details["contentDetails"].get("caption") == "true":
+                        added.append(video_id)
+                record.title = item["snippet"]["title"]
+                record.channel_title = item["snippet"].get("channelTitle")
+                record.duration_seconds = duration
+                record.has_captions = details["contentDetails"].get("caption") == "true"
+                record.view_count = int(details.get("statistics", {}).get("viewCount", 0))
+                record.crawled_at = datetime.utcnow()
+                existing = {t.topic for t in record.topics}
+                for topic in topics:
+                    if topic not in existing:
+                        record.topics.append(ListeningVideoTopic(topic=topic))
+                db.add(record)
+            db.commit()
+            return added
+        finally:
+            db.close()
+
+    def _query(self, band: str, topics: List[str], duration_range: Optional[Tuple[int, int]], limit: int) -> List[dict]:
+        db = SessionLocal()
+        try:
+            query = db.query(ListeningVideoRecord).options(selectinload(ListeningVideoRecord.topics)).filter(
+                ListeningVideoRecord.level_band == band,
+                ListeningVideoRecord.has_captions.is_(True)
+            )
+            if duration_range is not None:
+                query = query.filter(ListeningVideoRecord.duration_seconds.between(*duration_range))
+            if topics:
+                tagged = db.query(ListeningVideoTopic.video_id).filter(ListeningVideoTopic.topic.in_(topics))
+                query = query.filter(ListeningVideoRecord.video_id.in_(tagged))
+            records = query.order_by(ListeningVideoRecord.view_count.desc()).limit(limit).all()
+            return [
+                {
+                    "video_id": record.video_id,
+                    "title": record.title,
+                    "duration_seconds": record.duration_seconds,
+                    "level_band": record.level_band,
+                    "topics": [t.topic for t in record.topics],
+                    "transcript_key": record.transcript_key
+                }
+                for record in records
+            ]
+        finally:
+            db.close()
+
+    async def recommend(self,
+                        level: int,
+                        topics: Optional[List[str]] = None,
+                        duration_range: Optional[Tuple[int, int]] = None,
+                        limit: int = 10) -> List[dict]:
+        """
+        Return catalog videos for a level and any of the given topics, most viewed first
+        Args:
+            level: User level (0-30)
+            topics: Optional topics; videos tagged with any of them match. Only
+                LISTENING_CATALOG_TOPICS are used; if none of the topics is one of
+                them, the general catalog is served
+            duration_range: Optional inclusive (min, max) duration in seconds
+            limit: Maximum number of videos
+        """
+        self.start()
+        band = level_band(level)
+        # Free-text topics would each cost a search.list call and tag the catalog for good
+        topics = sorted({normalize_topic(t) for t in topics or [] if t.strip()} & set(self.topics))
+        videos = await asyncio.to_thread(self._query, band, topics, duration_range, limit)
+        video_duration = youtube_duration_filter(duration_range)
+        key = (band, tuple(topics), video_duration)
+        # Join a crawl in flight, but don't repeat one that just came back empty
+        if not videos and (key in self._crawls or not self._crawled_recently(key)):
+            # Nothing catalogued yet: crawl once (narrowed by YouTube's duration filter), then query again
+            await self.crawl(band, topics, video_duration)
+            videos = await asyncio.to_thread(self._query, band, topics, duration_range, limit)
+        return videos
@@ -0,0 +1,152 @@
+import os
+import time
+import json
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+def normalize_prompt(text: str, casefold: bool = False) -> str:
+    """Normalize prompt text so near-identical requests share a cache key"""
+    text = " ".join(unicodedata.normalize("NFC", str(text)).split())
+    return text.casefold() if casefold else text
+
+class InMemoryCacheBackend:
+    def __init__(self, max_entries: int):
+        """LRU dictionary with per-entry expiry"""
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key: str, value: str, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def size(self) -> int:
+        return len(self._entries)
+
+class SQLiteCacheBackend:
+    def __init__(self, path: str, max_entries: int):
+        """LRU cache in a SQLite file, shared by every worker on the host"""
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_last_access ON llm_cache (last_access)")
+    
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] < now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            return row[0]
+    
+    def set(self, key: str, value: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now)
+            )
+            # Evict expired entries, then the least recently used beyond the limit
+            self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+    
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+class LLMCache:
+    def __init__(self):
+        """
+        Response cache in front of LLM grading calls, keyed by a hash of the normalized prompt.
+        LLM_CACHE_BACKEND selects "memory" (default) or "sqlite".
+        """
+        self.ttl = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+        max_entries = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "10000"))
+        backend = os.getenv("LLM_CACHE_BACKEND", "memory")
+        if backend == "sqlite":
+            self.backend = SQLiteCacheBackend(os.getenv("LLM_CACHE_PATH", "llm_cache.db"), max_entries)
+        elif backend == "memory":
+            self.backend = InMemoryCacheBackend(max_entries)
+        else:
+            raise ValueError(f"Unknown LLM_CACHE_BACKEND: {backend}")
+        self.enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() != "false"
+        self._hits = 0
+        self._misses = 0
+    
+    @staticmethod
+    def make_key(namespace: str, *parts, casefold: bool = False) -> str:
+        """Hash a namespace and prompt parts into a cache key"""
+        normalized = [normalize_prompt(json.dumps(p, sort_keys=True) if not isinstance(p, str) else p, casefold)
+                      for p in parts]
+        digest = hashlib.sha256("\x00".join([namespace] + normalized).encode("utf-8")).hexdigest()
+        return f"{namespace}:{digest}"
+    
+    async def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        if isinstance(self.backend, SQLiteCacheBackend):
+            value = await asyncio.to_thread(self.backend.get, key)
+        else:
+            value = self.backend.get(key)
+        if value is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+        return value
+    
+    async def set(self, key: str, value: str):
+        if not self.enabled:
+            return
+        if isinstance(self.backend, SQLiteCacheBackend):
+            await asyncio.to_thread(self.backend.set, key, value, self.ttl)
+        else:
+            self.backend.set(key, value, self.ttl)
+    
+    def stats(self) -> Dict:
+        lookups = self._hits + self._misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "entries": self.backend.size()
+        }
+
+# Shared by every router that grades with an LLM
+llm_cache = LLMCache()
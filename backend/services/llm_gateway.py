@@ -0,0 +1,834 @@
+import os
+import json
+import time
+import random
+import asyncio
+from collections import deque
+from dotenv import load_dotenv
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+import aiohttp
+from .rate_limiter import RateLimiter, INTERACTIVE
+
+# Load environment variables
+load_dotenv()
+
+class LLMGatewayError(ValueError):
+    """Raised when a provider request fails (or every provider has failed)"""
+    pass
+
+class ProviderError(LLMGatewayError):
+    def __init__(self, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        """A failed provider request; status is None for network errors"""
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.status is None or self.status == 429 or self.status >= 500
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class LLMProvider:
+    """Base class for chat providers. Messages use the role/content format (system, user, assistant)."""
+    name = "provider"
+
+    async def chat(self, messages: List[Dict[str, str]], json_mode: bool = False, temperature: float = 0.7) -> str:
+        raise NotImplementedError
+
+    async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> AsyncIterator[str]:
+        # Providers without streaming return the whole reply as a single chunk
+        yield await self.chat(messages, temperature=temperature)
+
+    async def close(self):
+        pass
+
+class HTTPProvider(LLMProvider):
+    def __init__(self, api_key: str):
+        """Provider backed by a long-lived, keep-alive aiohttp connection pool"""
+        self.api_key = api_key
+        self.pool_limit = int(os.getenv("LLM_POOL_LIMIT", "100"))
+        self.pool_limit_per_host = int(os.getenv("LLM_POOL_LIMIT_PER_HOST", "20"))
+        self.keepalive_timeout = float(os.getenv("LLM_KEEPALIVE_TIMEOUT", "30"))
+        self.dns_cache_ttl = int(os.getenv("LLM_DNS_CACHE_TTL", "300"))
+        self.request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the provider's HTTP session, creating its connection pool on first use.
+        The session must be created inside a running event loop, so it is built lazily.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+                enable_cleanup_closed=True
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+        return self._session
+
+    async def _post(self, url: str, **kwargs) -> dict:
+        session = await self._get_session()
+        try:
+            async with session.post(url, **kwargs) as response:
+                if response.status != 200:
+                    raise ProviderError(
+                        f"{self.name} request failed ({response.status}): {await response.text()}",
+                        response.status,
+                        _retry_after(response.headers.get("Retry-After"))
+                    )
+                return await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ProviderError(f"{self.name} network error: {e!r}")
+
+    async def _post_lines(self, url: str, payload: dict) -> AsyncIterator[bytes]:
+        """POST a streaming request and yield the non-empty lines of the response body"""
+        session = await self._get_session()
+        try:
+            async with session.post(url, json=payload) as response:
+                if response.status != 200:
+                    raise ProviderError(
+                        f"{self.name} request failed ({response.status}): {await response.text()}",
+                        response.status,
+                        _retry_after(response.headers.get("Retry-After"))
+                    )
+                async for line in response.content:
+                    line = line.strip()
+                    if line:
+                        yield line
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ProviderError(f"{self.name} network error: {e!r}")
+
+    async def close(self):
+        """Close the connection pool and release all pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+class CohereProvider(HTTPProvider):
+    name = "cohere"
+    url = "https://api.cohere.ai/v1/chat"
+
+    def __init__(self, api_key: str):
+        super().__init__(api_key)
+        self.model = os.getenv("COHERE_MODEL", "command")
+
+    def _payload(self, messages: List[Dict[str, str]], temperature: float) -> dict:
+        """Split role/content messages into Cohere's preamble, chat_history and message"""
+        system = [m["content"] for m in messages if m["role"] == "system"]
+        turns = [m for m in messages if m["role"] != "system"]
+        payload = {
+            "message": turns[-1]["content"] if turns else "",
+            "chat_history": [
+                {"role": "User" if m["role"] == "user" else "Chatbot", "message": m["content"]}
+                for m in turns[:-1]
+            ],
+            "model": self.model,
+            "temperature": temperature,
+        }
+        if system:
+            payload["preamble"] = "\n\n".join(system)
+        return payload
+
+    async def chat(self, messages: List[Dict[str, str]], json_mode: bool = False, temperature: float = 0.7) -> str:
+        payload = self._payload(messages, temperature)
+        # Only the command-r family supports JSON mode; others rely on the prompt
+        if json_mode and self.model.startswith("command-r"):
+            payload["response_format"] = {"type": "json_object"}
+        result = await self._post(self.url, json=payload)
+        return result["text"]
+
+    async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> AsyncIterator[str]:
+        payload = {**self._payload(messages, temperature), "stream": True}
+        # Cohere streams one JSON event per line
+        async for line in self._post_lines(self.url, payload):
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise LLMGatewayError(f"Malformed stream event: {e}")
+            if event.get("event_type") == "text-generation":
+                yield event.get("text", "")
+            elif event.get("event_type") == "stream-end":
+                if event.get("finish_reason") not in (None, "COMPLETE", "MAX_TOKENS"):
+                    raise LLMGatewayError(f"Stream ended early: {event.get('finish_reason')}")
+                return
+
+class OpenAIProvider(HTTPProvider):
+    name = "openai"
+    base_url = "https://api.openai.com/v1"
+
+    def __init__(self, api_key: str):
+        super().__init__(api_key)
+        self.model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+
+    async def chat(self, messages: List[Dict[str, str]], json_mode: bool = False, temperature: float = 0.7) -> str:
+        payload = {"model": self.model, "messages": messages, "temperature": temperature}
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        result = await self._post(f"{self.base_url}/chat/completions", json=payload)
+        return result["choices"][0]["message"]["content"]
+
+    async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> AsyncIterator[str]:
+        payload = {"model": self.model, "messages": messages, "temperature": temperature, "stream": True}
+        # Server-sent events: "data: {...}" lines, terminated by "data: [DONE]"
+        async for line in self._post_lines(f"{self.base_url}/chat/completions", payload):
+            if not line.startswith(b"data:"):
+                continue
+            data = line[len(b"data:"):].strip()
+            if data == b"[DONE]":
+                return
+            try:
+                delta = json.loads(data)["choices"][0]["delta"].get("content")
+            except (json.JSONDecodeError, KeyError, IndexError) as e:
+                raise LLMGatewayError(f"Malformed stream event: {e}")
+            if delta:
+                yield delta
+
+    async def transcribe(self, audio: bytes, filename: str = "audio.webm") -> str:
+        """Transcribe audio with Whisper"""
+        form = aiohttp.FormData()
+        form.add_field("model", "whisper-1")
+        form.add_field("file", audio, filename=filename)
+        result = await self._post(f"{self.base_url}/audio/transcriptions", data=form)
+        return result["text"]
+
+class MockProvider(LLMProvider):
+    name = "mock"
+
+    def __init__(self):
+        """
+        Local provider for tests and offline development.
+        Chat replies echo the last message; JSON-mode replies return LLM_MOCK_JSON.
+        """
+        self.latency = float(os.getenv("LLM_MOCK_LATENCY", "0"))
+        self.json_reply = os.getenv("LLM_MOCK_JSON", "{}")
+
+    async def chat(self, messages: List[Dict[str, str]], json_mode: bool = False, temperature: float = 0.7) -> str:
+        await asyncio.sleep(self.latency)
+        if json_mode:
+            return self.json_reply
+        return f"Mock reply to: {messages[-1]['content'] if messages else ''}"
+
+    async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> AsyncIterator[str]:
+        reply = await self.chat(messages, temperature=temperature)
+        for word in reply.split(" "):
+            yield word + " "
+
+    async def transcribe(self, audio: bytes, filename: str = "audio.webm") -> str:
+        return "Mock transcript."
+
+# Call routes and their provider order. Conversation (speaking) calls have always used
+# Cohere; JSON grading and generation tasks were GPT-3.5 calls, so they prefer OpenAI.
+CONVERSATION = "conversation"
+TASK = "task"
+
+def route_provider_names() -> Dict[str, List[str]]:
+    """
+    Provider order per route from LLM_PROVIDERS (conversation) and LLM_TASK_PROVIDERS (task).
+    When only LLM_PROVIDERS is set (e.g. "mock"), tasks use the same order.
+    """
+    conversation = os.getenv("LLM_PROVIDERS", "cohere,openai")
+    task = os.getenv("LLM_TASK_PROVIDERS", "openai,cohere" if os.getenv("LLM_PROVIDERS") is None else conversation)
+    return {
+        route: [name.strip().lower() for name in names.split(",") if name.strip()]
+        for route, names in ((CONVERSATION, conversation), (TASK, task))
+    }
+
+def build_providers() -> Dict[str, List[LLMProvider]]:
+    """Create each configured provider once and order them per route, skipping those without an API key"""
+    factories = {
+        "cohere": lambda: CohereProvider(os.getenv("COHERE_API_KEY")) if os.getenv("COHERE_API_KEY") else None,
+        "openai": lambda: OpenAIProvider(os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") else None,
+        "mock": lambda: MockProvider(),
+    }
+    created: Dict[str, Optional[LLMProvider]] = {}
+    routes = {}
+    for route, names in route_provider_names().items():
+        routes[route] = []
+        for name in names:
+            if name not in factories:
+                raise ValueError(f"Unknown LLM provider: {name}")
+            if name not in created:
+                created[name] = factories[name]()
+            if created[name] is not None:
+                routes[route].append(created[name])
+    return routes
+
+class LLMGateway:
+    def __init__(self, providers: Optional[List[LLMProvider]] = None):
+        """
+        Single entry point for all LLM calls.
+        Each provider sits behind an adaptive rate limiter; rate-limited and transient
+        failures are retried with jittered exponential backoff before failing over to
+        the next provider for the call's route. Short interactive calls can opt in to
+        hedging: past their provider's recent p95 latency, a duplicate request is sent.
+        Args:
+            providers: Providers to use, in order, for every route (defaults to the environment)
+        """
+        if providers is not None:
+            self.routes = {CONVERSATION: providers, TASK: providers}
+        else:
+            self.routes = build_providers()
+        self.providers: List[LLMProvider] = []
+        for route_providers in self.routes.values():
+            for provider in route_providers:
+                if provider not in self.providers:
+                    self.providers.append(provider)
+        if not self.routes[CONVERSATION] or not self.routes[TASK]:
+            raise ValueError("No LLM provider configured (set COHERE_API_KEY or OPENAI_API_KEY)")
+        self.hedging = os.getenv("LLM_HEDGING", "true").lower() != "false"
+        # Used until a provider has enough latency samples for a p95
+        self.default_hedge_delay = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "3"))
+        self.min_hedge_samples = 20
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.retry_base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+        self.retry_max_delay = float(os.getenv("LLM_RETRY_MAX_DELAY", "20"))
+        self.limiters: Dict[str, RateLimiter] = {
+            p.name: RateLimiter(p.name, float(os.getenv(f"{p.name.upper()}_REQUESTS_PER_MINUTE", "60")))
+            for p in self.providers
+        }
+        # Latencies per provider, kept separately for hedged (short) calls and everything else
+        self._latencies: Dict[Tuple[str, bool], Deque[float]] = {
+            (p.name, hedge): deque(maxlen=500) for p in self.providers for hedge in (True, False)
+        }
+        self._counters: Dict[str, Dict[str, int]] = {
+            p.name: {"calls": 0, "failures": 0, "retries": 0, "hedged": 0, "hedge_wins": 0}
+            for p in self.providers
+        }
+
+    def hedge_delay(self, provider: LLMProvider) -> float:
+        """p95 latency of the provider's hedge-eligible calls"""
+        samples = self._latencies[(provider.name, True)]
+        if len(samples) < self.min_hedge_samples:
+            return self.default_hedge_delay
+        return _percentile(list(samples), 0.95)
+
+    def _backoff(self, attempt: int, error: ProviderError) -> float:
+        """Honour Retry-After when given, otherwise full-jitter exponential backoff"""
+        if error.retry_after is not None:
+            return min(error.retry_after, self.retry_max_delay)
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    async def _with_retry(self, provider: LLMProvider, priority: int, call: Callable[[], Awaitable]):
+        """Run call under the provider's rate limiter, retrying retryable failures"""
+        limiter = self.limiters[provider.name]
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire(priority)
+            try:
+                result = await call()
+            except ProviderError as e:
+                if e.status == 429:
+                    await limiter.throttle()
+                if not e.retryable or attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                self._counters[provider.name]["retries"] += 1
+                print(f"LLM provider {provider.name} failed ({e.status}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            else:
+                await limiter.recover()
+                return result
+
+    async def _timed_chat(self, provider: LLMProvider, messages, json_mode, temperature, priority, hedge) -> str:
+        async def call():
+            started = time.monotonic()
+            result = await provider.chat(messages, json_mode, temperature)
+            self._latencies[(provider.name, hedge)].append(time.monotonic() - started)
+            return result
+        return await self._with_retry(provider, priority, call)
+
+    async def _hedged_chat(self, provider: LLMProvider, messages, json_mode, temperature, priority, hedge) -> str:
+        """Send the request; if it is slower than p95, send a duplicate and take whichever finishes first"""
+        # Background work never hedges; it would only spend quota interactive calls need
+        hedge = hedge and self.hedging and priority == INTERACTIVE
+        first = asyncio.create_task(self._timed_chat(provider, messages, json_mode, temperature, priority, hedge))
+        if not hedge:
+            return await first
+        second = None
+        # The caller may be cancelled (e.g. by wait_for); never leave a request running for nobody
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.hedge_delay(provider))
+            if done:
+                return first.result()
+
+            self._counters[provider.name]["hedged"] += 1
+            second = asyncio.create_task(self._timed_chat(provider, messages, json_mode, temperature, priority, hedge))
+            pending = {first, second}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._counters[provider.name]["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in (first, second):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def chat(self, messages: List[Dict[str, str]], json_mode: bool = False, temperature: float = 0.7) -> str:
+        raise NotImplementedError
+
+    async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> AsyncIterator[str]:
+        # Providers without streaming return the whole reply as a single chunk
+        yield await self.chat(messages, temperature=temperature)
+
+    async def close(self):
+        pass
+
+class HTTPProvider(LLMProvider):
+    def __init__(self, api_key: str):
+        """Provider backed by a long-lived, keep-alive aiohttp connection pool"""
+        self.api_key = api_key
+        self.pool_limit = int(os.getenv("LLM_POOL_LIMIT", "100"))
+        self.pool_limit_per_host = int(os.getenv("LLM_POOL_LIMIT_PER_HOST", "20"))
+        self.keepalive_timeout = float(os.getenv("LLM_KEEPALIVE_TIMEOUT", "30"))
+        self.dns_cache_ttl = int(os.getenv("LLM_DNS_CACHE_TTL", "300"))
+        self.request_timeout = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the provider's HTTP session, creating its connection pool on first use.
+        The session must be created inside a running event loop, so it is built lazily.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+                enable_cleanup_closed=True
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+        return self._session
+
+    async def _post(self, url: str, **kwargs) -> dict:
+        session = await self._get_session()
+        try:
+            async with session.post(url, **kwargs) as response:
+                if response.status != 200:
+                    raise ProviderError(
+                        f"{self.name} request failed ({response.status}): {await response.text()}",
+                        response.status,
+                        _retry_after(response.headers.get("Retry-After"))
+                    )
+                return await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ProviderError(f"{self.name} network error: {e!r}")
+
+    async def _post_lines(self, url: str, payload: dict) -> AsyncIterator[bytes]:
+        """POST a streaming request and yield the non-empty lines of the response body"""
+        session = await self._get_session()
+        try:
+            async with session.post(url, json=payload) as response:
+                if response.status != 200:
+                    raise ProviderError(
+                        f"{self.name} request failed ({response.status}): {await response.text()}",
+                        response.status,
+                        _retry_after(response.headers.get("Retry-After"))
+                    )
+                async for line in response.content:
+                    line = line.strip()
+                    if line:
+                        yield line
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ProviderError(f"{self.name} network error: {e!r}")
+
+    async def close(self):
+        """Close the connection pool and release all pooled connections"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+class CohereProvider(HTTPProvider):
+    name = "cohere"
+    url = "https://api.cohere.ai/v1/chat"
+
+    def __init__(self, api_key: str):
+        super().__init__(api_key)
+        self.model = os.getenv("COHERE_MODEL", "command")
+
+    def _payload(self, messages: List[Dict[str, str]], temperature: float) -> dict:
+        """Split role/content messages into Cohere's preamble, chat_history and message"""
+        system = [m["content"] for m in messages if m["role"] == "system"]
+        turns = [m for m in messages if m["role"] != "system"]
+        payload = {
+            "message": turns[-1]["content"] if turns else "",
+            "chat_history": [
+                {"role": "User" if m["role"] == "user" else "Chatbot", "message": m["content"]}
+                for m in turns[:-1]
+            ],
+            "model": self.model,
+            "temperature": temperature,
+        }
+        if system:
+            payload["preamble"] = "\n\n".join(system)
+        return payload
+
+    async def chat(self, messages: List[Dict[str, str]], json_mode: bool = False, temperature: float = 0.7) -> str:
+        payload = self._payload(messages, temperature)
+        # Only the command-r family supports JSON mode; others rely on the prompt
+        if json_mode and self.model.startswith("command-r"):
+            payload["response_format"] = {"type": "json_object"}
+        result = await self._post(self.url, json=payload)
+        return result["text"]
+
+    async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> AsyncIterator[str]:
+        payload = {**self._payload(messages, temperature), "stream": True}
+        # Cohere streams one JSON event per line
+        async for line in self._post_lines(self.url, payload):
+            try:
+                event = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise LLMGatewayError(f"Malformed stream event: {e}")
+            if event.get("event_type") == "text-generation":
+                yield event.get("text", "")
+            elif event.get("event_type") == "stream-end":
+                if event.get("finish_reason") not in (None, "COMPLETE", "MAX_TOKENS"):
+                    raise LLMGatewayError(f"Stream ended early: {event.get('finish_reason')}")
+                return
+
+class OpenAIProvider(HTTPProvider):
+    name = "openai"
+    base_url = "https://api.openai.com/v1"
+
+    def __init__(self, api_key: str):
+        super().__init__(api_key)
+        self.model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+
+    async def chat(self, messages: List[Dict[str, str]], json_mode: bool = False, temperature: float = 0.7) -> str:
+        payload = {"model": self.model, "messages": messages, "temperature": temperature}
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        result = await self._post(f"{self.base_url}/chat/completions", json=payload)
+        return result["choices"][0]["message"]["content"]
+
+    async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> AsyncIterator[str]:
+        payload = {"model": self.model, "messages": messages, "temperature": temperature, "stream": True}
+        # Server-sent events: "data: {...}" lines, terminated by "data: [DONE]"
+        async for line in self._post_lines(f"{self.base_url}/chat/completions", payload):
+            if not line.startswith(b"data:"):
+                continue
+            data = line[len(b"data:"):].strip()
+            if data == b"[DONE]":
+                return
+            try:
+                delta = json.loads(data)["choices"][0]["delta"].get("content")
+            except (json.JSONDecodeError, KeyError, IndexError) as e:
+                raise LLMGatewayError(f"Malformed stream event: {e}")
+            if delta:
+                yield delta
+
+    async def transcribe(self, audio: bytes, filename: str = "audio.webm") -> str:
+        """Transcribe audio with Whisper"""
+        form = aiohttp.FormData()
+        form.add_field("model", "whisper-1")
+        form.add_field("file", audio, filename=filename)
+        result = await self._post(f"{self.base_url}/audio/transcriptions", data=form)
+        return result["text"]
+
+class MockProvider(LLMProvider):
+    name = "mock"
+
+    def __init__(self):
+        """
+        Local provider for tests and offline development.
+        Chat replies echo the last message; JSON-mode replies return LLM_MOCK_JSON.
+        """
+        self.latency = float(os.getenv("LLM_MOCK_LATENCY", "0"))
+        self.json_reply = os.getenv("LLM_MOCK_JSON", "{}")
+
+    async def chat(self, messages: List[Dict[str, str]], json_mode: bool = False, temperature: float = 0.7) -> str:
+        await asyncio.sleep(self.latency)
+        if json_mode:
+            return self.json_reply
+        return f"Mock reply to: {messages[-1]['content'] if messages else ''}"
+
+    async def stream(self, messages: List[Dict[str, str]], temperature: float = 0.7) -> AsyncIterator[str]:
+        reply = await self.chat(messages, temperature=temperature)
+        for word in reply.split(" "):
+            yield word + " "
+
+    async def transcribe(self, audio: bytes, filename: str = "audio.webm") -> str:
+        return "Mock transcript."
+
+# Call routes and their provider order. Conversation (speaking) calls have always used
+# Cohere; JSON grading and generation tasks were GPT-3.5 calls, so they prefer OpenAI.
+CONVERSATION = "conversation"
+TASK = "task"
+
+def route_provider_names() -> Dict[str, List[str]]:
+    """
+    Provider order per route from LLM_PROVIDERS (conversation) and LLM_TASK_PROVIDERS (task).
+    When only LLM_PROVIDERS is set (e.g. "mock"), tasks use the same order.
+    """
+    conversation = os.getenv("LLM_PROVIDERS", "cohere,openai")
+    task = os.getenv("LLM_TASK_PROVIDERS", "openai,cohere" if os.getenv("LLM_PROVIDERS") is None else conversation)
+    return {
+        route: [name.strip().lower() for name in names.split(",") if name.strip()]
+        for route, names in ((CONVERSATION, conversation), (TASK, task))
+    }
+
+def build_providers() -> Dict[str, List[LLMProvider]]:
+    """Create each configured provider once and order them per route, skipping those without an API key"""
+    factories = {
+        "cohere": lambda: CohereProvider(os.getenv("COHERE_API_KEY")) if os.getenv("COHERE_API_KEY") else None,
+        "openai": lambda: OpenAIProvider(os.getenv("OPENAI_API_KEY")) if os.getenv("OPENAI_API_KEY") else None,
+        "mock": lambda: MockProvider(),
+    }
+    created: Dict[str, Optional[LLMProvider]] = {}
+    routes = {}
+    for route, names in route_provider_names().items():
+        routes[route] = []
+        for name in names:
+            if name not in factories:
+                raise ValueError(f"Unknown LLM provider: {name}")
+            if name not in created:
+                created[name] = factories[name]()
+            if created[name] is not None:
+                routes[route].append(created[name])
+    return routes
+
+class LLMGateway:
+    def __init__(self, providers: Optional[List[LLMProvider]] = None):
+        """
+        Single entry point for all LLM calls.
+        Each provider sits behind an adaptive rate limiter; rate-limited and transient
+        failures are retried with jittered exponential backoff before failing over to
+        the next provider for the call's route. Short interactive calls can opt in to
+        hedging: past their provider's recent p95 latency, a duplicate request is sent.
+        Args:
+            providers: Providers to use, in order, for every route (defaults to the environment)
+        """
+        if providers is not None:
+            self.routes = {CONVERSATION: providers, TASK: providers}
+        else:
+            self.routes = build_providers()
+        self.providers: List[LLMProvider] = []
+        for route_providers in self.routes.values():
+            for provider in route_providers:
+                if provider not in self.providers:
+                    self.providers.append(provider)
+        if not self.routes[CONVERSATION] or not self.routes[TASK]:
+            raise ValueError("No LLM provider configured (set COHERE_API_KEY or OPENAI_API_KEY)")
+        self.hedging = os.getenv("LLM_HEDGING", "true").lower() != "false"
+        # Used until a provider has enough latency samples for a p95
+        self.default_hedge_delay = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "3"))
+        self.min_hedge_samples = 20
+        self.max_retries = int(os.getenv("LLM_MAX_RETRIES", "3"))
+        self.retry_base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+        self.retry_max_delay = float(os.getenv("LLM_RETRY_MAX_DELAY", "20"))
+        self.limiters: Dict[str, RateLimiter] = {
+            p.name: RateLimiter(p.name, float(os.getenv(f"{p.name.upper()}_REQUESTS_PER_MINUTE", "60")))
+            for p in self.providers
+        }
+        # Latencies per provider, kept separately for hedged (short) calls and everything else
+        self._latencies: Dict[Tuple[str, bool], Deque[float]] = {
+            (p.name, hedge): deque(maxlen=500) for p in self.providers for hedge in (True, False)
+        }
+        self._counters: Dict[str, Dict[str, int]] = {
+            p.name: {"calls": 0, "failures": 0, "retries": 0, "hedged": 0, "hedge_wins": 0}
+            for p in self.providers
+        }
+
+    def hedge_delay(self, provider: LLMProvider) -> float:
+        """p95 latency of the provider's hedge-eligible calls"""
+        samples = self._latencies[(provider.name, True)]
+        if len(samples) < self.min_hedge_samples:
+            return self.default_hedge_delay
+        return _percentile(list(samples), 0.95)
+
+    def _backoff(self, attempt: int, error: ProviderError) -> float:
+        """Honour Retry-After when given, otherwise full-jitter exponential backoff"""
+        if error.retry_after is not None:
+            return min(error.retry_after, self.retry_max_delay)
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    async def _with_retry(self, provider: LLMProvider, priority: int, call: Callable[[], Awaitable]):
+        """Run call under the provider's rate limiter, retrying retryable failures"""
+        limiter = self.limiters[provider.name]
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire(priority)
+            try:
+                result = await call()
+            except ProviderError as e:
+                if e.status == 429:
+                    await limiter.throttle()
+                if not e.retryable or attempt == self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                self._counters[provider.name]["retries"] += 1
+                print(f"LLM provider {provider.name} failed ({e.status}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+            else:
+                await limiter.recover()
+                return result
+
+    async def _timed_chat(self, provider: LLMProvider, messages, json_mode, temperature, priority, hedge) -> str:
+        async def call():
+            started = time.monotonic()
+            result = await provider.chat(messages, json_mode, temperature)
+            self._latencies[(provider.name, hedge)].append(time.monotonic() - started)
+            return result
+        return await self._with_retry(provider, priority, call)
+
+    async def _hedged_chat(self, provider: LLMProvider, messages, json_mode, temperature, priority, hedge) -> str:
+        """Send the request; if it is slower than p95, send a duplicate and take whichever finishes first"""
+        # Background work never hedges; it would only spend quota interactive calls need
+        hedge = hedge and self.hedging and priority == INTERACTIVE
+        first = asyncio.create_task(self._timed_chat(provider, messages, json_mode, temperature, priority, hedge))
+        if not hedge:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_delay(provider))
+        if done:
+            return first.result()
+
+        self._counters[provider.name]["hedged"] += 1
+        second = asyncio.create_task(self._timed_chat(provider, messages, json_mode, temperature, priority, hedge))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._counters[provider.name]["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def chat(self,
+                   messages: List[Dict[str, str]],
+                   json_mode: bool = False,
+                   temperature: float = 0.7,
+                   priority: int = INTERACTIVE,
+                   route: str = TASK,
+                   hedge: bool = False) -> str:
+        """
+        Get a chat completion from the first provider on the route that succeeds
+        Args:
+            messages: role/content messages (system, user, assistant)
+            json_mode: Ask the provider to return a JSON object
+            temperature: Sampling temperature
+            priority: INTERACTIVE for user-facing requests, BACKGROUND for jobs that can wait
+            route: CONVERSATION for speaking turns, TASK for grading and generation
+            hedge: Hedge slow requests; only for short, latency-sensitive calls
+        Returns:
+            Reply text
+        """
+        errors = []
+        for provider in self.routes[route]:
+            self._counters[provider.name]["calls"] += 1
+            try:
+                return await self._hedged_chat(provider, messages, json_mode, temperature, priority, hedge)
+            except Exception as e:
+                self._counters[provider.name]["failures"] += 1
+                print(f"LLM provider {provider.name} failed: {e}")
+                errors.append(f"{provider.name}: {e}")
+        raise LLMGatewayError(f"All LLM providers failed ({'; '.join(errors)})")
+
+    async def stream(self,
+                     messages: List[Dict[str, str]],
+                     temperature: float = 0.7,
+                     priority: int = INTERACTIVE,
+                     route: str = CONVERSATION) -> AsyncIterator[str]:
+        """
+        Stream a chat completion. Retries and fails over to the next provider only
+        if nothing has been yielded yet, so the client never sees a mixed reply.
+        """
+        errors = []
+        for provider in self.routes[route]:
+            self._counters[provider.name]["calls"] += 1
+            limiter = self.limiters[provider.name]
+            started = False
+            try:
+                for attempt in range(self.max_retries + 1):
+                    await limiter.acquire(priority)
+                    try:
+                        async for delta in provider.stream(messages, temperature):
+                            started = True
+                            yield delta
+                    except ProviderError as e:
+                        if e.status == 429:
+                            await limiter.throttle()
+                        if started or not e.retryable or attempt == self.max_retries:
+                            raise
+                        self._counters[provider.name]["retries"] += 1
+                        await asyncio.sleep(self._backoff(attempt, e))
+                    else:
+                        await limiter.recover()
+                        return
+            except Exception as e:
+                self._counters[provider.name]["failures"] += 1
+                if started:
+                    raise LLMGatewayError(f"{provider.name} stream failed: {e}")
+                print(f"LLM provider {provider.name} failed: {e}")
+                errors.append(f"{provider.name}: {e}")
+        raise LLMGatewayError(f"All LLM providers failed ({'; '.join(errors)})")
+
+    async def transcribe(self, audio: bytes, filename: str = "audio.webm", priority: int = INTERACTIVE) -> str:
+        """Transcribe audio with the first provider that supports it"""
+        for provider in self.providers:
+            if hasattr(provider, "transcribe"):
+                return await self._with_retry(provider, priority, lambda: provider.transcribe(audio, filename))
+        raise LLMGatewayError("No configured LLM provider supports transcription")
+
+    async def close(self):
+        """Close every provider's connection pool (called from the app lifespan)"""
+        for provider in self.providers:
+            await provider.close()
+
+    def stats(self) -> Dict[str, Dict]:
+        """Per-provider call counters, latency percentiles and rate limiter state"""
+        stats = {}
+        for provider in self.providers:
+            samples = list(self._latencies[(provider.name, False)])
+            hedged = list(self._latencies[(provider.name, True)])
+            stats[provider.name] = {
+                **self._counters[provider.name],
+                "p50_latency": _percentile(samples, 0.5) if samples else None,
+                "p95_latency": _percentile(samples, 0.95) if samples else None,
+                "hedged_p50_latency": _percentile(hedged, 0.5) if hedged else None,
+                "hedged_p95_latency": _percentile(hedged, 0.95) if hedged else None,
+                "hedge_delay": self.hedge_delay(provider),
+                "rate_limit": self.limiters[provider.name].stats()
+            }
+        return stats
+
+# Shared by every router and service that talks to an LLM
+llm_gateway = LLMGateway()
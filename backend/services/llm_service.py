@@ -1,94 +1,66 @@
-import os
 from dotenv import load_dotenv
-import cohere
-from cohere.errors import (
-    BadRequestError,
-    UnauthorizedError,
-    ForbiddenError,
-    NotFoundError,
-    TooManyRequestsError,
-    ServiceUnavailableError
-)
-from typing import List, Dict, Optional
-import aiohttp  # Added for async HTTP requests
-import asyncio
+from typing import List, Dict, Optional, AsyncIterator
+from .llm_gateway import llm_gateway, CONVERSATION
+from .rate_limiter import INTERACTIVE
 
 # Load environment variables
 load_dotenv()
 
 class LLMService:
-    def __init__(self):
-        """Initialize LLM service with Cohere"""
-        api_key = os.getenv('COHERE_API_KEY')
-        if not api_key:
-            raise ValueError("COHERE_API_KEY not found in environment variables")
-        self.client = cohere.Client(api_key)
-        self.api_key = api_key  # Store API key for async client
+    def __init__(self, gateway=llm_gateway):
+        """Initialize LLM service on top of the shared provider gateway"""
+        self.gateway = gateway
+    
+    def _format_messages(self,
+                         prompt: str,
+                         conversation_history: List[Dict[str, str]],
+                         system_prompt: Optional[str] = None) -> List[Dict[str, str]]:
+        """Build role/content messages from the history, system prompt and current message"""
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        for msg in conversation_history:
+            role = "user" if msg["role"] == "user" else "assistant"
+            messages.append({"role": role, "content": msg["content"]})
+        messages.append({"role": "user", "content": prompt})
+        return messages
     
     async def get_response(self, 
                           prompt: str, 
                           conversation_history: List[Dict[str, str]], 
-                          system_prompt: Optional[str] = None) -> str:
+                          system_prompt: Optional[str] = None,
+                          priority: int = INTERACTIVE,
+                          hedge: bool = False) -> str:
         """
-        Get AI response using Cohere's chat API asynchronously
+        Get AI response through the LLM gateway
         Args:
             prompt: The current user message
             conversation_history: List of previous messages
             system_prompt: Optional prompt to guide the AI's behavior
+            priority: Rate-limiter priority (INTERACTIVE or BACKGROUND)
+            hedge: Hedge slow requests; only for short conversational turns
         Returns:
             AI response text
         """
-        try:
-            # Format conversation history for Cohere
-            formatted_history = []
-            for msg in conversation_history:
-                role = "User" if msg["role"] == "user" else "Chatbot"
-                formatted_history.append({"role": role, "message": msg["content"]})
-            
-            # Add system prompt if provided
-            if system_prompt:
-                formatted_history.insert(0, {
-                    "role": "System",
-                    "message": system_prompt
-                })
-            
-            # Since Cohere's Python client doesn't have native async support,
-            # we'll use their REST API directly with aiohttp for true async behavior
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    "https://api.cohere.ai/v1/chat",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "message": prompt,
-                        "chat_history": formatted_history,
-                        "model": "command",
-                        "temperature": 0.7,
-                    }
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        return result['text']
-                    else:
-                        error_data = await response.json()
-                        raise ValueError(f"API request failed: {error_data}")
-            
-        except aiohttp.ClientError as e:
-            raise ValueError(f"Network error: {e}")
-        except UnauthorizedError:
-            raise ValueError("Invalid API key. Please check your Cohere API key.")
-        except BadRequestError as e:
-            raise ValueError(f"Invalid request format: {e}")
-        except TooManyRequestsError:
-            raise ValueError("Rate limit exceeded. Please try again later.")
-        except ServiceUnavailableError:
-            raise ValueError("Cohere service is temporarily unavailable.")
-        except (ForbiddenError, NotFoundError) as e:
-            raise ValueError(f"Error accessing Cohere API: {e}")
-        except Exception as e:
-            raise ValueError(f"Unexpected error: {e}")
+        messages = self._format_messages(prompt, conversation_history, system_prompt)
+        return await self.gateway.chat(messages, priority=priority, route=CONVERSATION, hedge=hedge)
+    
+    async def stream_response(self,
+                              prompt: str,
+                              conversation_history: List[Dict[str, str]],
+                              system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Stream the AI response through the LLM gateway token by token
+        Args:
+            prompt: The current user message
+            conversation_history: List of previous messages
+            system_prompt: Optional prompt to guide the AI's behavior
+        Yields:
+            Incremental pieces of the response text as they are generated
+        """
+        messages = self._format_messages(prompt, conversation_history, system_prompt)
+        async for delta in self.gateway.stream(messages, route=CONVERSATION):
+            yield delta
     
     def get_speaking_prompt(self) -> str:
         """Return the system prompt for speaking practice"""
@@ -0,0 +1,120 @@
+import re
+import string
+from difflib import SequenceMatcher
+from typing import List, Optional
+
+# Similarity at or above which a short answer may count as correct (typos, plurals);
+# it must also pass _is_minor_edit, otherwise it goes to the LLM
+MATCH_THRESHOLD = 0.85
+# Words shorter than this must match exactly ("tree"/"three", "hat"/"that")
+MIN_FUZZY_WORD_LENGTH = 5
+# Reference answers longer than this (in words) are treated as open-ended
+MAX_SHORT_ANSWER_WORDS = 4
+
+# Prefixes that turn a word into its opposite ("possible" / "impossible")
+NEGATION_PREFIXES = ("un", "in", "im", "ir", "il", "dis", "non")
+
+OPEN_ENDED_TYPES = {"open", "open_ended", "open-ended", "essay", "long_answer"}
+ARTICLES = {"a", "an", "the"}
+# Number words compared as digits, so "ten" matches "10"
+NUMBER_WORDS = {
+    word: str(value) for value, word in enumerate(
+        "zero one two three four five six seven eight nine ten eleven twelve thirteen "
+        "fourteen fifteen sixteen seventeen eighteen nineteen twenty".split()
+    )
+}
+NUMBER_WORDS.update({"thirty": "30", "forty": "40", "fifty": "50", "sixty": "60",
+                     "seventy": "70", "eighty": "80", "ninety": "90", "hundred": "100"})
+_PUNCTUATION = str.maketrans("", "", string.punctuation)
+# "B", "b)", "(B)", "B.", "B: some option text" (but not "e.g. ...")
+_OPTION_LETTER = re.compile(r"^\(?([a-h])(?:[).:](?=\s|$)|\)?\s*$|\s+-\s|\s*\)\s)", re.IGNORECASE)
+
+def normalize_answer(text: str) -> str:
+    """Lowercase, strip punctuation and leading articles, write number words as digits and collapse whitespace"""
+    words = str(text).lower().translate(_PUNCTUATION).split()
+    while words and words[0] in ARTICLES:
+        words = words[1:]
+    return " ".join(NUMBER_WORDS.get(word, word) for word in words)
+
+def _option_index(text: str, options: Optional[List[str]]) -> Optional[int]:
+    """Resolve an answer to a multiple-choice option index, by letter or by option text"""
+    text = str(text).strip()
+    match = _OPTION_LETTER.match(text)
+    if match:
+        index = ord(match.group(1).lower()) - ord("a")
+        if not options or index < len(options):
+            return index
+    if options:
+        normalized = normalize_answer(text)
+        for i, option in enumerate(options):
+            # Options are often written as "B) text"; compare against the text part too
+            option_text = _OPTION_LETTER.sub("", str(option).strip(), count=1)
+            if normalized in (normalize_answer(option), normalize_answer(option_text)):
+                return i
+    return None
+
+def _similarity(a: str, b: str) -> float:
+    return SequenceMatcher(None, a, b).ratio()
+
+def _negation_differs(a: str, b: str) -> bool:
+    """True if a negation prefix starts one word but not the other (a prefix added or removed)"""
+    for prefix in NEGATION_PREFIXES:
+        if a.startswith(prefix) != b.startswith(prefix):
+            return True
+    return False
+
+def _is_minor_edit(received: str, expected: str) -> bool:
+    """
+    True if the answers differ only by small edits inside words: same words in the
+    same order, each within one character in length and at least MIN_FUZZY_WORD_LENGTH
+    long, with no negation prefix added or removed.
+    """
+    received_words, expected_words = received.split(), expected.split()
+    if len(received_words) != len(expected_words):
+        return False
+    for given, correct in zip(received_words, expected_words):
+        if given == correct:
+            continue
+        if min(len(given), len(correct)) < MIN_FUZZY_WORD_LENGTH:
+            return False
+        if abs(len(given) - len(correct)) > 1 or _negation_differs(given, correct):
+            return False
+    return True
+
+def grade_locally(answer: dict) -> Optional[dict]:
+    """
+    Grade an answer without the LLM when the result is unambiguous.
+    Returns {"score", "feedback"} or None if the answer needs an LLM grader.
+    """
+    correct = answer.get("correct_answer")
+    question_type = str(answer.get("type", "")).lower()
+    if not correct or question_type in OPEN_ENDED_TYPES:
+        return None
+    given = answer.get("answer", "")
+    options = answer.get("options")
+    
+    if question_type == "multiple_choice" or options:
+        given_index = _option_index(given, options)
+        correct_index = _option_index(correct, options)
+        if given_index is not None and correct_index is not None:
+            if given_index == correct_index:
+                return {"score": 1.0, "feedback": "Correct."}
+            return {"score": 0.0, "feedback": f"Incorrect. The correct answer is {correct}."}
+        if question_type == "multiple_choice":
+            return None
+    
+    expected = normalize_answer(correct)
+    if len(expected.split()) > MAX_SHORT_ANSWER_WORDS:
+        return None
+    received = normalize_answer(given)
+    if not received:
+        return {"score": 0.0, "feedback": f"No answer given. The correct answer is {correct}."}
+    if received == expected:
+        return {"score": 1.0, "feedback": "Correct."}
+    
+    similarity = _similarity(received, expected)
+    if similarity >= MATCH_THRESHOLD and _is_minor_edit(received, expected):
+        return {"score": 1.0, "feedback": f"Correct. Check your spelling: {correct}."}
+    # Low similarity doesn't make a free-text answer wrong (synonyms, "the US" for "United States");
+    # only a resolved multiple-choice option is marked wrong without the LLM
+    return None
@@ -0,0 +1,147 @@
+import os
+import asyncio
+from typing import Callable, Awaitable, Dict, List, Optional, Tuple
+from sqlalchemy import func
+from ..database import SessionLocal, engine
+from ..models.reading import ReadingPassageRecord
+
+# Passages are pooled per level band rather than per exact level
+LEVEL_BANDS = [
+    (0, 10, "basic"),
+    (11, 20, "intermediate"),
+    (21, 30, "advanced"),
+]
+
+# Level that passages for each band are generated at
+BAND_LEVELS = {name: (low + high) // 2 for low, high, name in LEVEL_BANDS}
+
+def level_band(level: int) -> str:
+    """Return the band name for a 0-30 level"""
+    for low, high, name in LEVEL_BANDS:
+        if low <= level <= high:
+            return name
+    raise ValueError(f"Level {level} is outside 0-30")
+
+class PassagePool:
+    def __init__(self, generate: Callable[[int, Optional[str]], Awaitable[dict]]):
+        """
+        Warm pool of validated reading passages per (level band, topic).
+        Requests are served from the database; a background refill tops a pool
+        back up whenever it drops below the low watermark. Only the configured
+        topics are pooled, so arbitrary user topics can't trigger refills.
+        Args:
+            generate: Coroutine producing a validated passage dict for (level, topic)
+        """
+        self.generate = generate
+        self.low_watermark = int(os.getenv("PASSAGE_POOL_LOW_WATERMARK", "3"))
+        self.target_size = int(os.getenv("PASSAGE_POOL_TARGET_SIZE", "10"))
+        # Topics kept warm; any other topic is generated on demand only
+        self.warm_topics: List[str] = [""] + [
+            t.strip().lower() for t in os.getenv("PASSAGE_POOL_TOPICS", "").split(",") if t.strip()
+        ]
+        self._refills: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._started = False
+    
+    def start(self):
+        """Create the table and start filling every configured pool in the background"""
+        if self._started:
+            return
+        self._started = True
+        ReadingPassageRecord.__table__.create(bind=engine, checkfirst=True)
+        for _, _, band in LEVEL_BANDS:
+            for topic in self.warm_topics:
+                self._schedule_refill(band, topic)
+    
+    def _count(self, band: str, topic: str) -> int:
+        db = SessionLocal()
+        try:
+            return (
+                db.query(func.count(ReadingPassageRecord.id))
+                .filter(ReadingPassageRecord.level_band == band, ReadingPassageRecord.topic == topic)
+                .scalar()
+            )
+        finally:
+            db.close()
+    
+    def _pop(self, band: str, topic: str) -> Optional[dict]:
+        """Remove and return the oldest pooled passage, or None if the pool is empty"""
+        db = SessionLocal()
+        try:
+            while True:
+                record = (
+                    db.query(ReadingPassageRecord)
+                    .filter(ReadingPassageRecord.level_band == band, ReadingPassageRecord.topic == topic)
+                    .order_by(ReadingPassageRecord.id)
+                    .first()
+                )
+                if record is None:
+                    return None
+                passage = {
+                    "title": record.title,
+                    "content": record.content,
+                    "questions": record.questions,
+                    "level": record.level
+                }
+                # Another worker may have claimed the same row; only one delete succeeds
+                claimed = (
+                    db.query(ReadingPassageRecord)
+                    .filter(ReadingPassageRecord.id == record.id)
+                    .delete(synchronize_session=False)
+                )
+                db.commit()
+                if claimed:
+                    return passage
+        finally:
+            db.close()
+    
+    def _insert(self, band: str, topic: str, passage: dict):
+        db = SessionLocal()
+        try:
+            db.add(ReadingPassageRecord(
+                level_band=band,
+                topic=topic,
+                level=passage["level"],
+                title=passage["title"],
+                content=passage["content"],
+                questions=passage["questions"]
+            ))
+            db.commit()
+        finally:
+            db.close()
+    
+    async def take(self, level: int, topic: Optional[str] = None) -> Optional[dict]:
+        """
+        Serve a pooled passage, or None on a miss (the caller then generates on demand).
+        Topics outside PASSAGE_POOL_TOPICS are never pooled and always miss.
+        """
+        self.start()
+        band = level_band(level)
+        topic = (topic or "").strip().lower()
+        if topic not in self.warm_topics:
+            return None
+        passage = await asyncio.to_thread(self._pop, band, topic)
+        if await asyncio.to_thread(self._count, band, topic) < self.low_watermark:
+            self._schedule_refill(band, topic)
+        if passage is not None:
+            # Pooled passages are written at the band midpoint; report the level asked for
+            passage["level"] = level
+        return passage
+    
+    def _schedule_refill(self, band: str, topic: str):
+        key = (band, topic)
+        if key in self._refills:
+            return
+        task = asyncio.create_task(self._refill(band, topic))
+        self._refills[key] = task
+        task.add_done_callback(lambda _: self._refills.pop(key, None))
+    
+    async def _refill(self, band: str, topic: str):
+        """Generate passages until the pool reaches its target size"""
+        level = BAND_LEVELS[band]
+        try:
+            missing = self.target_size - await asyncio.to_thread(self._count, band, topic)
+            for _ in range(missing):
+                passage = await self.generate(level, topic or None)
+                await asyncio.to_thread(self._insert, band, topic, passage)
+        except Exception as e:
+            print(f"Error refilling reading passage pool {band}/{topic or 'general'}: {e}")
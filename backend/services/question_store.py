@@ -0,0 +1,82 @@
+import os
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Dict, List, Set, Tuple
+from ..database import SessionLocal, engine
+from ..models.listening import ListeningQuestionSetRecord
+from .passage_pool import BAND_LEVELS, level_band
+from .rate_limiter import INTERACTIVE, BACKGROUND
+
+def transcript_hash(transcript: str) -> str:
+    """Hash a transcript with whitespace normalized, so re-fetched copies share an entry"""
+    return hashlib.sha256(" ".join(transcript.split()).encode("utf-8")).hexdigest()
+
+class QuestionStore:
+    def __init__(self, generate: Callable[[str, int, int], Awaitable[List[dict]]]):
+        """
+        Generated listening questions keyed by (transcript hash, level band).
+        A question set is generated and validated once, then served from the database.
+        Args:
+            generate: Coroutine producing validated question dicts for (transcript, level, priority)
+        """
+        self.generate = generate
+        self._pregenerate_limit = asyncio.Semaphore(int(os.getenv("QUESTION_PREGENERATE_CONCURRENCY", "2")))
+        self._generations: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._pregenerations: Set[asyncio.Task] = set()
+        self._table_ready = False
+
+    def _ensure_table(self):
+        if not self._table_ready:
+            ListeningQuestionSetRecord.__table__.create(bind=engine, checkfirst=True)
+            self._table_ready = True
+
+    def _load(self, key: str, band: str):
+        self._ensure_table()
+        db = SessionLocal()
+        try:
+            record = db.get(ListeningQuestionSetRecord, (key, band))
+            return record.questions if record is not None else None
+        finally:
+            db.close()
+
+    def _save(self, key: str, band: str, questions: List[dict]):
+        db = SessionLocal()
+        try:
+            db.merge(ListeningQuestionSetRecord(transcript_hash=key, level_band=band, questions=questions))
+            db.commit()
+        finally:
+            db.close()
+
+    async def _generate(self, transcript: str, key: str, band: str, priority: int) -> List[dict]:
+        # Questions are written for the middle of the band so every level in it can share them
+        questions = await self.generate(transcript, BAND_LEVELS[band], priority)
+        await asyncio.to_thread(self._save, key, band, questions)
+        return questions
+
+    async def get(self, transcript: str, level: int, priority: int = INTERACTIVE) -> List[dict]:
+        """Return the question set for a transcript at a level, generating it on the first request"""
+        key = transcript_hash(transcript)
+        band = level_band(level)
+        questions = await asyncio.to_thread(self._load, key, band)
+        if questions is not None:
+            return questions
+        if (key, band) not in self._generations:
+            task = asyncio.create_task(self._generate(transcript, key, band, priority))
+            self._generations[(key, band)] = task
+            task.add_done_callback(lambda _: self._generations.pop((key, band), None))
+        # Concurrent requests for the same transcript share one generation
+        return await asyncio.shield(self._generations[(key, band)])
+
+    def pregenerate(self, load_transcript: Callable[[], Awaitable[str]], band: str):
+        """Generate a question set in the background (e.g. when a video enters the catalog)"""
+        task = asyncio.create_task(self._pregenerate(load_transcript, band))
+        # Hold a reference so the task isn't garbage collected mid-flight
+        self._pregenerations.add(task)
+        task.add_done_callback(self._pregenerations.discard)
+
+    async def _pregenerate(self, load_transcript: Callable[[], Awaitable[str]], band: str):
+        async with self._pregenerate_limit:
+            try:
+                await self.get(await load_transcript(), BAND_LEVELS[band], priority=BACKGROUND)
+            except Exception as e:
+                print(f"Error pre-generating listening questions ({band}): {e}")
@@ -0,0 +1,170 @@
+import os
+import time
+import heapq
+import asyncio
+import itertools
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Request priorities; lower values are served first
+INTERACTIVE = 0
+BACKGROUND = 1
+
+class InMemoryBucketBackend:
+    def __init__(self):
+        """Token buckets for a single worker"""
+        self._buckets: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, name: str, capacity: float, max_rate: float) -> float:
+        """Take one token; return 0 on success or the seconds until one is available"""
+        now = time.time()
+        with self._lock:
+            tokens, updated_at, rate = self._buckets.setdefault(name, [capacity, now, max_rate])
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            if tokens >= 1:
+                self._buckets[name] = [tokens - 1, now, rate]
+                return 0.0
+            self._buckets[name] = [tokens, now, rate]
+            return (1 - tokens) / rate
+
+    def scale_rate(self, name: str, factor: float, min_rate: float, max_rate: float) -> float:
+        with self._lock:
+            bucket = self._buckets.setdefault(name, [0.0, time.time(), max_rate])
+            bucket[2] = max(min_rate, min(max_rate, bucket[2] * factor))
+            return bucket[2]
+
+class SQLiteBucketBackend:
+    def __init__(self, path: str):
+        """Token buckets in a SQLite file, shared by every worker on the host"""
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, rate REAL NOT NULL)"
+        )
+
+    def _load(self, name: str, capacity: float, max_rate: float, now: float) -> Tuple[float, float, float]:
+        row = self._conn.execute(
+            "SELECT tokens, updated_at, rate FROM rate_buckets WHERE name = ?", (name,)
+        ).fetchone()
+        return row if row is not None else (capacity, now, max_rate)
+
+    def take(self, name: str, capacity: float, max_rate: float) -> float:
+        """Take one token; return 0 on success or the seconds until one is available"""
+        with self._lock:
+            # BEGIN IMMEDIATE holds the write lock, so workers can't take the same token
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                tokens, updated_at, rate = self._load(name, capacity, max_rate, now)
+                tokens = min(capacity, tokens + (now - updated_at) * rate)
+                wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+                if tokens >= 1:
+                    tokens -= 1
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated_at, rate) VALUES (?, ?, ?, ?)",
+                    (name, tokens, now, rate)
+                )
+                self._conn.execute("COMMIT")
+                return wait
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def scale_rate(self, name: str, factor: float, min_rate: float, max_rate: float) -> float:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                tokens, updated_at, rate = self._load(name, 0.0, max_rate, now)
+                rate = max(min_rate, min(max_rate, rate * factor))
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_buckets (name, tokens, updated_at, rate) VALUES (?, ?, ?, ?)",
+                    (name, tokens, updated_at, rate)
+                )
+                self._conn.execute("COMMIT")
+                return rate
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+def _bucket_backend():
+    backend = os.getenv("LLM_RATE_LIMIT_BACKEND", "memory")
+    if backend == "sqlite":
+        return SQLiteBucketBackend(os.getenv("LLM_RATE_LIMIT_PATH", "llm_rate_limit.db"))
+    if backend == "memory":
+        return InMemoryBucketBackend()
+    raise ValueError(f"Unknown LLM_RATE_LIMIT_BACKEND: {backend}")
+
+class RateLimiter:
+    def __init__(self, name: str, requests_per_minute: float, backend=None):
+        """
+        Adaptive token bucket for one provider.
+        The rate is halved whenever the provider answers 429 and creeps back up
+        towards requests_per_minute on success. Waiters are served by priority,
+        so interactive requests go ahead of queued background jobs.
+        """
+        self.name = name
+        self.max_rate = requests_per_minute / 60
+        self.min_rate = self.max_rate * float(os.getenv("LLM_RATE_MIN_FRACTION", "0.1"))
+        self.capacity = float(os.getenv("LLM_RATE_BURST", "5"))
+        self.recovery = float(os.getenv("LLM_RATE_RECOVERY", "1.05"))
+        self.backend = backend if backend is not None else _bucket_backend()
+        self.rate = self.max_rate
+        self._sqlite = isinstance(self.backend, SQLiteBucketBackend)
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._throttled = 0
+
+    async def _call(self, fn, *args):
+        if self._sqlite:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def acquire(self, priority: int = INTERACTIVE):
+        """Wait for a token. Lower priority values are granted first; equal priorities are FIFO."""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        # A cancelled waiter's future is done, so the dispatcher skips it
+        await future
+
+    async def _dispatch(self):
+        """Hand out tokens to the highest-priority waiter as they become available"""
+        while self._waiters:
+            if self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+                continue
+            wait = await self._call(self.backend.take, self.name, self.capacity, self.max_rate)
+            if wait > 0:
+                self._throttled += 1
+                await asyncio.sleep(wait)
+                continue
+            while self._waiters:
+                _, _, future = heapq.heappop(self._waiters)
+                if not future.done():
+                    future.set_result(None)
+                    break
+
+    async def throttle(self):
+        """The provider rejected a request for rate; back off for everyone sharing the bucket"""
+        self.rate = await self._call(self.backend.scale_rate, self.name, 0.5, self.min_rate, self.max_rate)
+        print(f"LLM rate limit for {self.name} lowered to {self.rate * 60:.1f}/min")
+
+    async def recover(self):
+        if self.rate < self.max_rate:
+            self.rate = await self._call(self.backend.scale_rate, self.name, self.recovery, self.min_rate, self.max_rate)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "requests_per_minute": round(self.rate * 60, 1),
+            "max_requests_per_minute": round(self.max_rate * 60, 1),
+            "queued": sum(1 for _, _, f in self._waiters if not f.done()),
+            "throttled": self._throttled
+        }
@@ -0,0 +1,181 @@
+import os
+import time
+import uuid
+import asyncio
+import azure.cognitiveservices.speech as speechsdk
+from typing import Optional, Callable, Awaitable, Dict
+from .speech_service import SpeechService
+
+class RecognizerPoolFullError(Exception):
+    """Raised when the maximum number of concurrent recognition sessions is reached"""
+    pass
+
+# Audio formats the browser may stream; compressed formats are decoded by the SDK
+COMPRESSED_FORMATS = {
+    "opus": speechsdk.AudioStreamContainerFormat.OGG_OPUS,
+    "mp3": speechsdk.AudioStreamContainerFormat.MP3,
+    "any": speechsdk.AudioStreamContainerFormat.ANY,
+}
+
+class RecognitionSession:
+    def __init__(self, session_id: str, speech_service: SpeechService):
+        """Continuous recognition state owned by a single WebSocket connection"""
+        self.session_id = session_id
+        # Unique per connection, so two sockets for one session never share a recognizer
+        self.connection_id = uuid.uuid4().hex
+        self.speech_service = speech_service
+        self.recognizer: Optional[speechsdk.SpeechRecognizer] = None
+        self.push_stream: Optional[speechsdk.audio.PushAudioInputStream] = None
+        self.last_used = time.monotonic()
+    
+    def touch(self):
+        self.last_used = time.monotonic()
+    
+    async def start(self,
+                    callback: Callable[[str, bool], Awaitable[None]],
+                    audio_format: str = "pcm",
+                    sample_rate: int = 16000) -> bool:
+        """
+        Start continuous recognition over audio pushed from the client.
+        Args:
+            callback: Receives (text, is_final) for interim and final results
+            audio_format: "pcm" (16-bit mono) or a compressed format such as "opus"
+            sample_rate: Sample rate of PCM audio
+        """
+        self.touch()
+        try:
+            await self.stop()
+            loop = asyncio.get_running_loop()
+            
+            if audio_format == "pcm":
+                stream_format = speechsdk.audio.AudioStreamFormat(
+                    samples_per_second=sample_rate,
+                    bits_per_sample=16,
+                    channels=1
+                )
+            elif audio_format in COMPRESSED_FORMATS:
+                stream_format = speechsdk.audio.AudioStreamFormat(
+                    compressed_stream_format=COMPRESSED_FORMATS[audio_format]
+                )
+            else:
+                raise ValueError(f"Unsupported audio format: {audio_format}")
+            push_stream = speechsdk.audio.PushAudioInputStream(stream_format=stream_format)
+            audio_config = speechsdk.audio.AudioConfig(stream=push_stream)
+            
+            # The SpeechConfig is shared and already configured, only the recognizer is per session
+            recognizer = speechsdk.SpeechRecognizer(
+                speech_config=self.speech_service.speech_config,
+                audio_config=audio_config
+            )
+            
+            # SDK events arrive on SDK threads, so hand results back to the event loop
+            def handle_partial(evt):
+                self.touch()
+                if evt.result.text:
+                    asyncio.run_coroutine_threadsafe(callback(evt.result.text, False), loop)
+            
+            def handle_result(evt):
+                self.touch()
+                if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech:
+                    asyncio.run_coroutine_threadsafe(callback(evt.result.text, True), loop)
+            
+            recognizer.recognizing.connect(handle_partial)
+            recognizer.recognized.connect(handle_result)
+            await self.speech_service.run_blocking(lambda: recognizer.start_continuous_recognition_async().get())
+            self.recognizer = recognizer
+            self.push_stream = push_stream
+            return True
+        except Exception as e:
+            print(f"Error starting recognition for session {self.session_id}: {str(e)}")
+            return False
+    
+    def write(self, chunk: bytes) -> bool:
+        """Push a chunk of client audio into the recognizer"""
+        self.touch()
+        if self.push_stream is None:
+            return False
+        self.push_stream.write(chunk)
+        return True
+    
+    async def stop(self) -> bool:
+        """Stop continuous speech recognition"""
+        self.touch()
+        recognizer = self.recognizer
+        if recognizer is None:
+            return False
+        self.recognizer = None
+        if self.push_stream is not None:
+            # Closing the stream flushes the final utterance
+            self.push_stream.close()
+            self.push_stream = None
+        try:
+            await self.speech_service.run_blocking(lambda: recognizer.stop_continuous_recognition_async().get())
+            return True
+        except Exception as e:
+            print(f"Error stopping recognition for session {self.session_id}: {str(e)}")
+            return False
+
+class RecognizerPool:
+    def __init__(self, speech_service: SpeechService):
+        """Per-connection recognizers with a concurrency cap and idle reaping"""
+        self.speech_service = speech_service
+        self.max_sessions = int(os.getenv("MAX_SPEECH_SESSIONS", "500"))
+        self.idle_timeout = float(os.getenv("SPEECH_SESSION_IDLE_TIMEOUT", "300"))
+        # Keyed by connection_id; several connections may share a session_id
+        self.sessions: Dict[str, RecognitionSession] = {}
+        self._reaper: Optional[asyncio.Task] = None
+        self._reaped = 0
+    
+    def acquire(self, session_id: str) -> RecognitionSession:
+        """Create a recognition session owned by the calling connection"""
+        if len(self.sessions) >= self.max_sessions:
+            raise RecognizerPoolFullError("Too many concurrent speaking sessions")
+        session = RecognitionSession(session_id, self.speech_service)
+        self.sessions[session.connection_id] = session
+        return session
+    
+    async def release(self, session: RecognitionSession):
+        """Stop and forget a recognition session; only the connection that acquired it calls this"""
+        if self.sessions.get(session.connection_id) is session:
+            del self.sessions[session.connection_id]
+        await session.stop()
+    
+    async def reap_idle(self):
+        """
+        Stop recognizers that have not been used within the idle timeout.
+        Every pooled session belongs to a live WebSocket (it is released when the
+        socket closes), so sessions keep their slot and can start recording again.
+        """
+        cutoff = time.monotonic() - self.idle_timeout
+        for session in list(self.sessions.values()):
+            if session.recognizer is not None and session.last_used < cutoff:
+                await session.stop()
+                self._reaped += 1
+    
+    async def _reap_forever(self):
+        while True:
+            await asyncio.sleep(max(1.0, self.idle_timeout / 4))
+            try:
+                await self.reap_idle()
+            except Exception as e:
+                print(f"Error reaping idle recognition sessions: {e}")
+    
+    def start(self):
+        """Start the background idle reaper (called from the app lifespan)"""
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_forever())
+    
+    async def close(self):
+        """Stop the reaper and every active recognition session"""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for session in list(self.sessions.values()):
+            await self.release(session)
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active_sessions": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "reaped": self._reaped
+        }
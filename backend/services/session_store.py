@@ -0,0 +1,173 @@
+import os
+import uuid
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Dict, Optional
+from database import SessionLocal, engine
+from models.speaking import (
+    SpeakingSession,
+    Message,
+    SpeakingSessionRecord,
+    SpeakingTurnRecord
+)
+
+class SessionNotFoundError(Exception):
+    """Raised when a speaking session id is unknown"""
+    pass
+
+class SpeakingSessionStore:
+    def __init__(self):
+        """
+        Server-side storage for speaking sessions.
+        An in-process LRU cache sits in front of append-only SQLAlchemy tables,
+        so clients only need to send the session_id with each turn.
+        """
+        self.max_cached = int(os.getenv("SESSION_CACHE_SIZE", "1000"))
+        self._cache: "OrderedDict[str, SpeakingSession]" = OrderedDict()
+        # In-flight loads, so concurrent cache misses share one SpeakingSession object
+        self._loading: Dict[str, asyncio.Task] = {}
+    
+    def init_schema(self):
+        """Create the session tables if they do not exist yet"""
+        SpeakingSessionRecord.__table__.create(bind=engine, checkfirst=True)
+        SpeakingTurnRecord.__table__.create(bind=engine, checkfirst=True)
+    
+    def _remember(self, session: SpeakingSession):
+        self._cache[session.id] = session
+        self._cache.move_to_end(session.id)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+    
+    async def create(self, session: SpeakingSession) -> SpeakingSession:
+        """Persist a new session (and any opening turns) and return it with its id"""
+        session.id = session.id or str(uuid.uuid4())
+        
+        def insert():
+            db = SessionLocal()
+            try:
+                db.add(SpeakingSessionRecord(
+                    id=session.id,
+                    user_id=session.user_id,
+                    topic=session.topic,
+                    difficulty_level=session.difficulty_level,
+                    created_at=session.created_at
+                ))
+                db.add_all(self._turn_records(session.id, 0, session.conversation_history))
+                db.commit()
+            finally:
+                db.close()
+        
+        await asyncio.to_thread(insert)
+        self._remember(session)
+        return session
+    
+    async def get(self, session_id: str) -> Optional[SpeakingSession]:
+        """Return the session from cache, loading it from the database on a miss"""
+        session = self._cache.get(session_id)
+        if session is not None:
+            self._cache.move_to_end(session_id)
+            return session
+        
+        if session_id not in self._loading:
+            task = asyncio.create_task(self._load(session_id))
+            self._loading[session_id] = task
+            task.add_done_callback(lambda _: self._loading.pop(session_id, None))
+        return await asyncio.shield(self._loading[session_id])
+    
+    async def _load(self, session_id: str) -> Optional[SpeakingSession]:
+        def load() -> Optional[SpeakingSession]:
+            db = SessionLocal()
+            try:
+                record = db.query(SpeakingSessionRecord).filter(SpeakingSessionRecord.id == session_id).first()
+                if record is None:
+                    return None
+                turns = (
+                    db.query(SpeakingTurnRecord)
+                    .filter(SpeakingTurnRecord.session_id == session_id)
+                    .order_by(SpeakingTurnRecord.turn_index)
+                    .all()
+                )
+                return SpeakingSession(
+                    id=record.id,
+                    user_id=record.user_id,
+                    topic=record.topic,
+                    difficulty_level=record.difficulty_level,
+                    conversation_history=[
+                        Message(role=t.role, content=t.content, timestamp=t.timestamp)
+                        for t in turns
+                    ],
+                    created_at=record.created_at,
+                    ended_at=record.ended_at,
+                    final_feedback=record.final_feedback
+                )
+            finally:
+                db.close()
+        
+        session = await asyncio.to_thread(load)
+        if session is not None:
+            self._remember(session)
+        return session
+    
+    async def history(self, session_id: str) -> List[Dict[str, str]]:
+        """Conversation history in the role/content form the LLM service expects"""
+        session = await self.get(session_id)
+        if session is None:
+            raise SessionNotFoundError(f"Speaking session {session_id} not found")
+        return [{"role": m.role, "content": m.content} for m in session.conversation_history]
+    
+    async def append(self, session_id: str, messages: List[Message]):
+        """Append turns to a session; only the new turns are written"""
+        session = await self.get(session_id)
+        if session is None:
+            raise SessionNotFoundError(f"Speaking session {session_id} not found")
+        
+        # Indexes are assigned before the write so concurrent appends keep their order
+        first_index = len(session.conversation_history)
+        session.conversation_history.extend(messages)
+        records = self._turn_records(session_id, first_index, messages)
+        
+        def insert():
+            db = SessionLocal()
+            try:
+                db.add_all(records)
+                db.commit()
+            finally:
+                db.close()
+        
+        await asyncio.to_thread(insert)
+    
+    async def end(self, session_id: str, feedback: str) -> SpeakingSession:
+        """Mark the session as ended and record the final feedback"""
+        session = await self.get(session_id)
+        if session is None:
+            raise SessionNotFoundError(f"Speaking session {session_id} not found")
+        session.ended_at = datetime.now()
+        session.final_feedback = feedback
+        
+        def update():
+            db = SessionLocal()
+            try:
+                db.query(SpeakingSessionRecord).filter(SpeakingSessionRecord.id == session_id).update({
+                    "ended_at": session.ended_at,
+                    "final_feedback": feedback
+                })
+                db.commit()
+            finally:
+                db.close()
+        
+        await asyncio.to_thread(update)
+        return session
+    
+    @staticmethod
+    def _turn_records(session_id: str, first_index: int, messages: List[Message]) -> List[SpeakingTurnRecord]:
+        return [
+            SpeakingTurnRecord(
+                session_id=session_id,
+                turn_index=first_index + i,
+                role=m.role,
+                content=m.content,
+                timestamp=m.timestamp
+            )
+            for i, m in enumerate(messages)
+        ]
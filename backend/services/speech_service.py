@@ -2,7 +2,10 @@ import os
 from dotenv import load_dotenv
 import azure.cognitiveservices.speech as speechsdk
 import asyncio
-from typing import Optional, Callable
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Dict, AsyncIterator
+from .tts_cache import TTSCache
 
 # Load environment variables
 load_dotenv()
@@ -22,48 +25,169 @@ class SpeechService:
         )
         self.speech_config.speech_recognition_language = "en-US"
         self.speech_config.speech_synthesis_voice_name = "en-US-JennyNeural"
+        # Compressed output so audio can be streamed to the browser as it is generated
+        self.output_format = getattr(
+            speechsdk.SpeechSynthesisOutputFormat,
+            os.getenv("TTS_OUTPUT_FORMAT", "Audio24Khz48KBitRateMonoMp3")
+        )
+        self.speech_config.set_speech_synthesis_output_format(self.output_format)
+        self.audio_chunk_size = 16 * 1024
+        
+        # Repeated tutor phrases are served from cache instead of re-synthesized
+        self.tts_cache = TTSCache()
         
-        self.recognizer = None
         self.synthesizer = None
+        
+        # The Azure SDK only exposes blocking .get() on its result futures, so every
+        # SDK call runs on a bounded pool instead of the event loop thread
+        self.max_workers = int(os.getenv("SPEECH_EXECUTOR_WORKERS", "8"))
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="azure-speech"
+        )
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._running = 0
+        self._completed = 0
+        self._max_queued = 0
     
-    async def start_continuous_recognition(self, callback):
-        """Start continuous speech recognition"""
+    async def run_blocking(self, fn: Callable, *args):
+        """Run a blocking SDK call on the speech executor and await its result"""
+        def run():
+            with self._stats_lock:
+                self._running += 1
+            try:
+                return fn(*args)
+            finally:
+                with self._stats_lock:
+                    self._running -= 1
+        
+        with self._stats_lock:
+            self._in_flight += 1
+            self._max_queued = max(self._max_queued, self._in_flight - self._running)
         try:
-            self.recognizer = speechsdk.SpeechRecognizer(speech_config=self.speech_config)
-            
-            def handle_result(evt):
-                if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech:
-                    callback(evt.result.text)
-            
-            self.recognizer.recognized.connect(handle_result)
-            self.recognizer.start_continuous_recognition()
-            return True
-        except Exception as e:
-            print(f"Error starting recognition: {str(e)}")
-            return False
+            return await asyncio.get_running_loop().run_in_executor(self.executor, run)
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+                self._completed += 1
     
-    async def stop_continuous_recognition(self):
-        """Stop continuous speech recognition"""
-        try:
-            if self.recognizer:
-                self.recognizer.stop_continuous_recognition()
-                return True
-            return False
-        except Exception as e:
-            print(f"Error stopping recognition: {str(e)}")
-            return False
+    def executor_stats(self) -> Dict[str, int]:
+        """Queue depth and throughput metrics for the speech executor"""
+        with self._stats_lock:
+            return {
+                "workers": self.max_workers,
+                "in_flight": self._in_flight,
+                "running": self._running,
+                "queued": self._in_flight - self._running,
+                "max_queued": self._max_queued,
+                "completed": self._completed
+            }
+    
+    @property
+    def audio_mime_type(self) -> str:
+        """MIME type of the configured synthesis output format"""
+        name = self.output_format.name
+        if "Mp3" in name:
+            return "audio/mpeg"
+        if "Webm" in name:
+            return "audio/webm"
+        if "Ogg" in name:
+            return "audio/ogg"
+        if "Riff" in name:
+            return "audio/wav"
+        return "application/octet-stream"
+    
+    def _new_synthesizer(self) -> speechsdk.SpeechSynthesizer:
+        """Create a synthesizer that keeps audio in memory instead of playing it on a device"""
+        return speechsdk.SpeechSynthesizer(speech_config=self.speech_config, audio_config=None)
+    
+    def _cache_key(self, text: str) -> str:
+        return TTSCache.make_key(
+            text,
+            self.speech_config.speech_synthesis_voice_name,
+            self.output_format.name
+        )
+    
+    async def _get_cached_audio(self, key: str) -> Optional[bytes]:
+        audio = self.tts_cache.get_hot(key)
+        if audio is None:
+            audio = await self.run_blocking(self.tts_cache.get, key)
+        return audio
+    
+    def close(self):
+        """Shut down the speech executor, dropping calls that have not started"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
     
     async def synthesize_speech(self, text: str) -> bool:
         """Synthesize speech from text"""
+        return await self.synthesize_audio(text) is not None
+    
+    async def synthesize_audio(self, text: str) -> Optional[bytes]:
+        """
+        Synthesize speech from text and return the audio bytes.
+        Results are cached by (normalized text, voice, format).
+        """
+        key = self._cache_key(text)
         try:
+            audio = await self._get_cached_audio(key)
+            if audio is not None:
+                return audio
+            
             if not self.synthesizer:
-                self.synthesizer = speechsdk.SpeechSynthesizer(speech_config=self.speech_config)
+                self.synthesizer = self._new_synthesizer()
+            
+            synthesizer = self.synthesizer
+            result = await self.run_blocking(lambda: synthesizer.speak_text_async(text).get())
+            if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+                return None
             
-            result = self.synthesizer.speak_text_async(text).get()
-            return result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted
+            await self.run_blocking(self.tts_cache.put, key, result.audio_data)
+            return result.audio_data
         except Exception as e:
             print(f"Error synthesizing speech: {str(e)}")
-            return False
+            return None
+    
+    async def stream_audio(self, text: str) -> AsyncIterator[bytes]:
+        """
+        Synthesize speech from text, yielding audio chunks as Azure produces them.
+        Cached phrases are yielded straight from the cache.
+        Raises ValueError if synthesis fails.
+        """
+        key = self._cache_key(text)
+        audio = await self._get_cached_audio(key)
+        if audio is not None:
+            for start in range(0, len(audio), self.audio_chunk_size):
+                yield audio[start:start + self.audio_chunk_size]
+            return
+        
+        # Each stream gets its own synthesizer so concurrent streams do not share events
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        synthesizer = self._new_synthesizer()
+        synthesizer.synthesizing.connect(
+            lambda evt: loop.call_soon_threadsafe(chunks.put_nowait, evt.result.audio_data)
+        )
+        
+        synthesis = asyncio.ensure_future(
+            self.run_blocking(lambda: synthesizer.speak_text_async(text).get())
+        )
+        synthesis.add_done_callback(lambda _: chunks.put_nowait(None))
+        try:
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                if chunk:
+                    yield chunk
+            
+            result = synthesis.result()
+            if result.reason != speechsdk.ResultReason.SynthesizingAudioCompleted:
+                raise ValueError(f"Speech synthesis failed: {result.reason}")
+            await self.run_blocking(self.tts_cache.put, key, result.audio_data)
+        finally:
+            if not synthesis.done():
+                synthesis.cancel()
     
     async def recognize_speech(self) -> tuple[str, bool]:
         """
@@ -71,8 +195,8 @@ class SpeechService:
         Returns: (text, success)
         """
         try:
-            self.recognizer = speechsdk.SpeechRecognizer(speech_config=self.speech_config)
-            result = self.recognizer.recognize_once_async().get()
+            recognizer = speechsdk.SpeechRecognizer(speech_config=self.speech_config)
+            result = await self.run_blocking(lambda: recognizer.recognize_once_async().get())
             
             if result.reason == speechsdk.ResultReason.RecognizedSpeech:
                 return result.text, True
@@ -93,9 +217,12 @@ class SpeechService:
         Returns: (text, success)
         """
         try:
-            audio_config = speechsdk.AudioConfig(filename=file_path)
-            recognizer = speechsdk.SpeechRecognizer(speech_config=self.speech_config, audio_config=audio_config)
-            result = recognizer.recognize_once_async().get()
+            def recognize():
+                audio_config = speechsdk.AudioConfig(filename=file_path)
+                recognizer = speechsdk.SpeechRecognizer(speech_config=self.speech_config, audio_config=audio_config)
+                return recognizer.recognize_once_async().get()
+            
+            result = await self.run_blocking(recognize)
             if result.reason == speechsdk.ResultReason.RecognizedSpeech:
                 return result.text, True
             elif result.reason == speechsdk.ResultReason.NoMatch:
@@ -106,4 +233,37 @@ class SpeechService:
                 return "", False
         except Exception as e:
             print(f"Error in speech recognition from file: {e}")
-            return "", False 
\ No newline at end of file
+            return "", False
+    
+    async def recognize_speech_from_pcm(self, pcm: bytes, sample_rate: int = 16000) -> tuple[str, bool]:
+        """
+        Recognize speech from raw 16-bit mono PCM held in memory.
+        The audio is fed to Azure through a push stream, so nothing touches disk.
+        Returns: (text, success)
+        """
+        try:
+            def recognize():
+                stream_format = speechsdk.audio.AudioStreamFormat(
+                    samples_per_second=sample_rate,
+                    bits_per_sample=16,
+                    channels=1
+                )
+                push_stream = speechsdk.audio.PushAudioInputStream(stream_format=stream_format)
+                push_stream.write(pcm)
+                push_stream.close()
+                audio_config = speechsdk.audio.AudioConfig(stream=push_stream)
+                recognizer = speechsdk.SpeechRecognizer(speech_config=self.speech_config, audio_config=audio_config)
+                return recognizer.recognize_once_async().get()
+            
+            result = await self.run_blocking(recognize)
+            if result.reason == speechsdk.ResultReason.RecognizedSpeech:
+                return result.text, True
+            elif result.reason == speechsdk.ResultReason.NoMatch:
+                print(f"No speech could be recognized: {result.no_match_details}")
+                return "", False
+            else:
+                print(f"Error recognizing speech: {result.reason}")
+                return "", False
+        except Exception as e:
+            print(f"Error in speech recognition from PCM: {e}")
+            return "", False
@@ -0,0 +1,118 @@
+import os
+import re
+import ast
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type, TypeVar
+from pydantic import BaseModel, ValidationError
+from .llm_cache import llm_cache
+from .llm_gateway import llm_gateway
+from .rate_limiter import INTERACTIVE
+
+# orjson is several times faster than the standard library; fall back when it is missing
+try:
+    import orjson
+    
+    def _loads(text: str) -> Any:
+        return orjson.loads(text)
+except ImportError:
+    def _loads(text: str) -> Any:
+        return json.loads(text)
+
+T = TypeVar("T", bound=BaseModel)
+
+# A model call that takes an optional correction note and returns the raw reply text
+StructuredCall = Callable[[Optional[str]], Awaitable[str]]
+
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$", re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_PYTHON_LITERALS = {r"\bTrue\b": "true", r"\bFalse\b": "false", r"\bNone\b": "null"}
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+
+class StructuredOutputError(ValueError):
+    """Raised when a model reply cannot be turned into the expected structure"""
+    pass
+
+def extract_json(text: str) -> str:
+    """Strip code fences and surrounding prose, keeping the outermost JSON object or array"""
+    text = _CODE_FENCE.sub("", text.strip())
+    starts = [i for i in (text.find("{"), text.find("[")) if i != -1]
+    if not starts:
+        return text
+    start = min(starts)
+    end = text.rfind("}" if text[start] == "{" else "]")
+    return text[start:end + 1] if end > start else text[start:]
+
+def repair_json(text: str) -> str:
+    """Fix the mistakes models commonly make: smart quotes, trailing commas, Python literals"""
+    text = _TRAILING_COMMA.sub(r"\1", text.translate(_SMART_QUOTES))
+    for pattern, replacement in _PYTHON_LITERALS.items():
+        text = re.sub(pattern, replacement, text)
+    return text
+
+def parse_json(text: str) -> Any:
+    """
+    Parse a model reply as JSON, trying progressively more forgiving strategies.
+    Never evaluates code: the last resort is ast.literal_eval, which only accepts literals.
+    """
+    candidate = extract_json(text)
+    for attempt in (text, candidate, repair_json(candidate)):
+        try:
+            return _loads(attempt)
+        except ValueError:
+            continue
+    try:
+        return ast.literal_eval(candidate)
+    except (ValueError, SyntaxError) as e:
+        raise StructuredOutputError(f"Reply is not valid JSON: {e}")
+
+def parse_model(text: str, model: Type[T]) -> T:
+    """Parse a model reply and validate it into a Pydantic model"""
+    try:
+        return model.model_validate(parse_json(text))
+    except ValidationError as e:
+        raise StructuredOutputError(f"Reply does not match {model.__name__}: {e}")
+
+def schema_instructions(model: Type[BaseModel]) -> str:
+    """Prompt text describing the JSON the model must return"""
+    return f"Respond with a single JSON object only, matching this JSON schema: {json.dumps(model.model_json_schema())}"
+
+async def request_structured(call: StructuredCall,
+                             model: Type[T],
+                             retries: Optional[int] = None,
+                             cache_key: Optional[str] = None) -> T:
+    """
+    Call a model and validate its reply, asking it to correct itself if the reply is unusable.
+    Only the failed parse is retried, not the surrounding request.
+    With a cache_key, validated results are served from and stored in the shared LLM cache.
+    """
+    if cache_key:
+        cached = await llm_cache.get(cache_key)
+        if cached is not None:
+            try:
+                return parse_model(cached, model)
+            except StructuredOutputError:
+                pass  # Stale entry from an older schema; fetch a fresh one
+    
+    retries = int(os.getenv("STRUCTURED_OUTPUT_RETRIES", "1")) if retries is None else retries
+    correction = None
+    for attempt in range(retries + 1):
+        content = await call(correction)
+        try:
+            result = parse_model(content, model)
+            if cache_key:
+                await llm_cache.set(cache_key, result.model_dump_json())
+            return result
+        except StructuredOutputError as e:
+            if attempt == retries:
+                raise
+            correction = (
+                f"Your previous reply could not be used ({str(e)[:300]}). "
+                + schema_instructions(model)
+            )
+
+def json_call(messages: List[Dict[str, str]], temperature: float = 0.7, priority: int = INTERACTIVE) -> StructuredCall:
+    """Build a StructuredCall for a JSON-mode chat request through the LLM gateway"""
+    async def call(correction: Optional[str]) -> str:
+        request_messages = messages if correction is None else messages + [{"role": "user", "content": correction}]
+        return await llm_gateway.chat(request_messages, json_mode=True, temperature=temperature, priority=priority)
+    return call
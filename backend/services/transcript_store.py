@@ -0,0 +1,238 @@
+import os
+import re
+import json
+import zlib
+import time
+import asyncio
+import threading
+import urllib.request
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import yt_dlp
+from ..database import SessionLocal, engine
+from ..models.listening import ListeningTranscriptRecord, ListeningVideoRecord
+
+# Caption formats we can parse, in order of preference
+CAPTION_FORMATS = ["json3", "vtt"]
+
+_VTT_TIMING = re.compile(r"(?:(\d+):)?(\d{2}):(\d{2})\.(\d{3})\s+-->\s+(?:(\d+):)?(\d{2}):(\d{2})\.(\d{3})")
+_VTT_TAG = re.compile(r"<[^>]+>")
+
+class TranscriptNotFoundError(Exception):
+    """Raised when a video has no English captions"""
+    pass
+
+def _vtt_seconds(hours: Optional[str], minutes: str, seconds: str, millis: str) -> float:
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
+
+def parse_vtt(data: str) -> List[Dict]:
+    """Parse WebVTT captions into time-aligned segments"""
+    segments = []
+    for block in re.split(r"\n\s*\n", data.replace("\r\n", "\n")):
+        lines = block.strip().split("\n")
+        for i, line in enumerate(lines):
+            timing = _VTT_TIMING.search(line)
+            if timing is None:
+                continue
+            groups = timing.groups()
+            text = " ".join(_VTT_TAG.sub("", l).strip() for l in lines[i + 1:]).strip()
+            # Auto-generated captions repeat the previous line as they scroll
+            if text and (not segments or segments[-1]["text"] != text):
+                segments.append({
+                    "start": _vtt_seconds(*groups[:4]),
+                    "end": _vtt_seconds(*groups[4:]),
+                    "text": text
+                })
+            break
+    return segments
+
+def parse_json3(data: str) -> List[Dict]:
+    """Parse YouTube's json3 caption format into time-aligned segments"""
+    segments = []
+    for event in json.loads(data).get("events", []):
+        text = "".join(seg.get("utf8", "") for seg in event.get("segs") or []).strip()
+        if not text:
+            continue
+        start = event.get("tStartMs", 0) / 1000
+        segments.append({
+            "start": start,
+            "end": start + event.get("dDurationMs", 0) / 1000,
+            "text": " ".join(text.split())
+        })
+    return segments
+
+def transcript_text(segments: List[Dict]) -> str:
+    return " ".join(segment["text"] for segment in segments)
+
+class TranscriptStore:
+    def __init__(self):
+        """
+        Parsed caption segments per video.
+        A small in-memory LRU sits in front of a database table; misses are scraped
+        with yt_dlp in a worker thread, so the event loop never blocks. A video with
+        no English captions is not scraped again until TRANSCRIPT_RETRY_HOURS pass.
+        """
+        self.max_entries = int(os.getenv("TRANSCRIPT_CACHE_ENTRIES", "256"))
+        self.retry_after = float(os.getenv("TRANSCRIPT_RETRY_HOURS", "24")) * 3600
+        self.fetch_timeout = float(os.getenv("TRANSCRIPT_FETCH_TIMEOUT", "15"))
+        self._prefetch_limit = asyncio.Semaphore(int(os.getenv("TRANSCRIPT_PREFETCH_CONCURRENCY", "2")))
+        self._memory: "OrderedDict[str, List[Dict]]" = OrderedDict()
+        # Videos without captions -> time (epoch seconds) after which they may be scraped again
+        self._missing: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._fetches: Dict[str, asyncio.Task] = {}
+        # Prefetches queued or running, by video id
+        self._prefetches: Dict[str, asyncio.Task] = {}
+        self._table_ready = False
+
+    def _ensure_table(self):
+        if not self._table_ready:
+            ListeningTranscriptRecord.__table__.create(bind=engine, checkfirst=True)
+            # _save points catalog entries at stored transcripts, even before the catalog has started
+            ListeningVideoRecord.__table__.create(bind=engine, checkfirst=True)
+            self._table_ready = True
+
+    def _remember(self, video_id: str, segments: List[Dict], retry_at: float):
+        with self._lock:
+            if not segments:
+                now = time.time()
+                # Drop expired entries so the negative cache stays small
+                for expired in [v for v, at in self._missing.items() if at <= now]:
+                    del self._missing[expired]
+                self._missing[video_id] = retry_at
+                return
+            self._missing.pop(video_id, None)
+            self._memory[video_id] = segments
+            self._memory.move_to_end(video_id)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _missing_until(self, video_id: str) -> Optional[float]:
+        """Retry time of an unexpired negative entry, or None"""
+        with self._lock:
+            retry_at = self._missing.get(video_id)
+        return retry_at if retry_at is not None and retry_at > time.time() else None
+
+    def _load(self, video_id: str) -> Optional[Tuple[List[Dict], datetime]]:
+        db = SessionLocal()
+        try:
+            record = db.get(ListeningTranscriptRecord, video_id)
+            if record is None:
+                return None
+            return json.loads(zlib.decompress(record.segments)), record.created_at
+        finally:
+            db.close()
+
+    def _save(self, video_id: str, segments: List[Dict]):
+        db = SessionLocal()
+        try:
+            db.merge(ListeningTranscriptRecord(
+                video_id=video_id,
+                segments=zlib.compress(json.dumps(segments, separators=(",", ":")).encode("utf-8")),
+                segment_count=len(segments),
+                # Set explicitly so a re-scrape restarts the retry clock
+                created_at=datetime.utcnow()
+            ))
+            if segments:
+                # Point the catalog entry (if any) at the stored transcript
+                db.query(ListeningVideoRecord).filter(ListeningVideoRecord.video_id == video_id).update(
+                    {"transcript_key": video_id}, synchronize_session=False
+                )
+            db.commit()
+        finally:
+            db.close()
+
+    def _scrape(self, video_id: str) -> List[Dict]:
+        """Find the English caption track with yt_dlp, download it and parse it (blocking)"""
+        ydl_opts = {
+            'skip_download': True,
+            'quiet': True,
+            'writesubtitles': True,
+            'writeautomaticsub': True,
+            'subtitleslangs': ['en'],
+        }
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(f"https://www.youtube.com/watch?v={video_id}", download=False)
+
+        # Prefer uploaded captions over automatic ones
+        tracks = None
+        for source in (info.get("subtitles") or {}, info.get("automatic_captions") or {}):
+            language = "en" if "en" in source else next((l for l in source if l.startswith("en-")), None)
+            if language:
+                tracks = {track.get("ext"): track["url"] for track in source[language]}
+                break
+        if not tracks:
+            return []
+
+        for ext in CAPTION_FORMATS:
+            if ext in tracks:
+                with urllib.request.urlopen(tracks[ext], timeout=self.fetch_timeout) as response:
+                    data = response.read().decode("utf-8")
+                return parse_json3(data) if ext == "json3" else parse_vtt(data)
+        return []
+
+    def _fetch(self, video_id: str) -> Tuple[List[Dict], float]:
+        """
+        Database first, then scrape and store (runs in a worker thread).
+        Returns the segments and, for [] results, when the video may be scraped again.
+        """
+        self._ensure_table()
+        loaded = self._load(video_id)
+        if loaded is not None:
+            segments, created_at = loaded
+            checked_at = (created_at - datetime(1970, 1, 1)).total_seconds() if created_at else 0
+            retry_at = checked_at + self.retry_after
+            if segments or retry_at > time.time():
+                return segments, retry_at
+        segments = self._scrape(video_id)
+        # Videos without English captions are stored as [] so they aren't scraped again until the retry time
+        self._save(video_id, segments)
+        return segments, time.time() + self.retry_after
+
+    async def get(self, video_id: str) -> List[Dict]:
+        """
+        Return the time-aligned caption segments for a video
+        Raises TranscriptNotFoundError if it has no English captions.
+        """
+        if self._missing_until(video_id) is not None:
+            raise TranscriptNotFoundError(f"No English transcript available for {video_id}")
+        with self._lock:
+            segments = self._memory.get(video_id)
+            if segments is not None:
+                self._memory.move_to_end(video_id)
+        if segments is None:
+            if video_id not in self._fetches:
+                task = asyncio.create_task(asyncio.to_thread(self._fetch, video_id))
+                self._fetches[video_id] = task
+                task.add_done_callback(lambda _: self._fetches.pop(video_id, None))
+            # Concurrent requests for the same video share one fetch
+            segments, retry_at = await asyncio.shield(self._fetches[video_id])
+            self._remember(video_id, segments, retry_at)
+        if not segments:
+            raise TranscriptNotFoundError(f"No English transcript available for {video_id}")
+        return segments
+
+    def prefetch(self, video_ids: List[str]):
+        """Fetch transcripts in the background, a few at a time; ids already cached, queued or fetching are skipped"""
+        for video_id in video_ids:
+            if video_id in self._prefetches or video_id in self._fetches:
+                continue
+            with self._lock:
+                cached = video_id in self._memory
+            # Cached, or known to have no captions and not due for a retry
+            if cached or self._missing_until(video_id) is not None:
+                continue
+            task = asyncio.create_task(self._prefetch(video_id))
+            # Hold a reference so the task isn't garbage collected mid-flight
+            self._prefetches[video_id] = task
+            task.add_done_callback(lambda _, video_id=video_id: self._prefetches.pop(video_id, None))
+
+    async def _prefetch(self, video_id: str):
+        async with self._prefetch_limit:
+            try:
+                await self.get(video_id)
+            except TranscriptNotFoundError:
+                pass
+            except Exception as e:
+                print(f"Error prefetching transcript for {video_id}: {e}")
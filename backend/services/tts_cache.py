@@ -0,0 +1,124 @@
+import os
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict
+
+class TTSCache:
+    def __init__(self):
+        """
+        Two-tier cache for synthesized speech.
+        A small in-memory LRU holds hot phrases, backed by an on-disk LRU store.
+        Both tiers evict by total size in bytes.
+        """
+        self.cache_dir = Path(os.getenv("TTS_CACHE_DIR", "tts_cache"))
+        self.max_memory_bytes = int(os.getenv("TTS_CACHE_MEMORY_MB", "32")) * 1024 * 1024
+        self.max_disk_bytes = int(os.getenv("TTS_CACHE_DISK_MB", "512")) * 1024 * 1024
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = sum(p.stat().st_size for p in self.cache_dir.glob("*/*.audio"))
+        self._hits_memory = 0
+        self._hits_disk = 0
+        self._misses = 0
+    
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Normalize text so trivially different phrasings share a cache entry"""
+        return " ".join(unicodedata.normalize("NFC", text).split())
+    
+    @classmethod
+    def make_key(cls, text: str, voice: str, audio_format: str) -> str:
+        """Content address for a synthesis request"""
+        raw = "\x00".join([cls.normalize_text(text), voice, audio_format])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.audio"
+    
+    def _remember(self, key: str, audio: bytes):
+        """Insert into the memory tier, evicting least recently used entries (lock held)"""
+        if len(audio) > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = audio
+        self._memory_bytes += len(audio)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+    
+    def get_hot(self, key: str) -> Optional[bytes]:
+        """Look up the memory tier only; never touches disk"""
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self._hits_memory += 1
+            return audio
+    
+    def get(self, key: str) -> Optional[bytes]:
+        """Look up both tiers, promoting disk hits to memory. Performs blocking disk I/O."""
+        audio = self.get_hot(key)
+        if audio is not None:
+            return audio
+        
+        path = self._path(key)
+        try:
+            audio = path.read_bytes()
+            os.utime(path)  # Refresh mtime, which orders the disk LRU
+        except FileNotFoundError:
+            with self._lock:
+                self._misses += 1
+            return None
+        
+        with self._lock:
+            self._hits_disk += 1
+            self._remember(key, audio)
+        return audio
+    
+    def put(self, key: str, audio: bytes):
+        """Store audio in both tiers. Performs blocking disk I/O."""
+        with self._lock:
+            self._remember(key, audio)
+        
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        tmp_path = path.with_suffix(f".tmp{threading.get_ident()}")
+        tmp_path.write_bytes(audio)
+        previous_size = path.stat().st_size if path.exists() else 0
+        os.replace(tmp_path, path)
+        
+        with self._lock:
+            self._disk_bytes += len(audio) - previous_size
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+    
+    def _evict_disk(self):
+        """Delete least recently used files until the disk tier fits its budget (lock held)"""
+        files = sorted(self.cache_dir.glob("*/*.audio"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                self._disk_bytes -= size
+            except FileNotFoundError:
+                continue
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            return {
+                "hits_memory": self._hits_memory,
+                "hits_disk": self._hits_disk,
+                "misses": self._misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self._disk_bytes
+            }
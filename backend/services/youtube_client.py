@@ -0,0 +1,87 @@
+import os
+import asyncio
+import threading
+from typing import Dict, List
+import httplib2
+from googleapiclient.discovery import build
+
+# videos.list accepts at most 50 ids per request
+VIDEOS_PER_REQUEST = 50
+
+class YouTubeClient:
+    def __init__(self):
+        """
+        Async wrapper around the YouTube Data API discovery client.
+        The client is built once and reused; requests run in worker threads so the
+        event loop never blocks. YOUTUBE_API_ENDPOINT points the client at another
+        server, e.g. http://localhost:8081/ for fake_youtube_api.py.
+        """
+        self.api_key = os.getenv("YOUTUBE_API_KEY")
+        self.api_endpoint = os.getenv("YOUTUBE_API_ENDPOINT")
+        self.timeout = float(os.getenv("YOUTUBE_REQUEST_TIMEOUT", "10"))
+        self._client = None
+        self._build_lock = threading.Lock()
+        # httplib2.Http is not thread-safe, so each worker thread gets its own
+        self._local = threading.local()
+
+    def _get_client(self):
+        with self._build_lock:
+            if self._client is None:
+                client_options = {"api_endpoint": self.api_endpoint} if self.api_endpoint else None
+                self._client = build(
+                    "youtube", "v3",
+                    developerKey=self.api_key,
+                    client_options=client_options,
+                    cache_discovery=False
+                )
+            return self._client
+
+    def _http(self) -> httplib2.Http:
+        if not hasattr(self._local, "http"):
+            self._local.http = httplib2.Http(timeout=self.timeout)
+        return self._local.http
+
+    def _execute(self, make_request) -> dict:
+        """Build and execute a request in the calling (worker) thread"""
+        return make_request(self._get_client()).execute(http=self._http())
+
+    async def search(self, query: str, max_results: int = 10, **filters) -> List[dict]:
+        """Search for videos; filters are passed through to search.list (e.g. videoCaption)"""
+        response = await asyncio.to_thread(
+            self._execute,
+            lambda client: client.search().list(
+                q=query,
+                part="snippet",
+                maxResults=max_results,
+                type="video",
+                **filters
+            )
+        )
+        return response.get("items", [])
+
+    async def videos(self, video_ids: List[str], part: str = "contentDetails,statistics") -> Dict[str, dict]:
+        """Fetch details for many videos in as few videos.list calls as possible, keyed by video id"""
+        chunks = [video_ids[i:i + VIDEOS_PER_REQUEST] for i in range(0, len(video_ids), VIDEOS_PER_REQUEST)]
+        responses = await asyncio.gather(*(
+            asyncio.to_thread(
+                self._execute,
+                lambda client, chunk=chunk: client.videos().list(part=part, id=",".join(chunk), maxResults=len(chunk))
+            )
+            for chunk in chunks
+        ))
+        return {item["id"]: item for response in responses for item in response.get("items", [])}
+
+    async def search_videos(self, query: str, max_results: int = 10, **filters) -> List[dict]:
+        """
+        Search and attach video details in two requests (one search.list, one videos.list).
+        Returns search items with a "details" key; videos without details are dropped.
+        """
+        items = await self.search(query, max_results, **filters)
+        details = await self.videos([item["id"]["videoId"] for item in items])
+        return [
+            {**item, "details": details[item["id"]["videoId"]]}
+            for item in items if item["id"]["videoId"] in details
+        ]
+
+# Shared YouTube Data API client
+youtube_client = YouTubeClient()
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Add the backend directory to Python path
+backend_dir = Path(__file__).parent
+sys.path.append(str(backend_dir))
+
+import uvicorn
+from fake_youtube_api import app
+
+PORT = int(os.getenv("FAKE_YOUTUBE_PORT", "8081"))
+
+# Point the client at the fake API before it is created
+os.environ["YOUTUBE_API_ENDPOINT"] = f"http://127.0.0.1:{PORT}/"
+os.environ.setdefault("YOUTUBE_API_KEY", "fake-key")
+
+from services.youtube_client import YouTubeClient
+
+def start_fake_api() -> uvicorn.Server:
+    """Serve fake_youtube_api.py in a background thread and wait until it accepts requests"""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+async def main():
+    print(f"Starting fake YouTube API on port {PORT}...")
+    server = start_fake_api()
+    client = YouTubeClient()
+
+    try:
+        items = await client.search("basic english listening", max_results=5, videoCaption="closedCaption")
+        print(f"search: {len(items)} results")
+        assert len(items) == 5, "search should return max_results items"
+
+        # More ids than one videos.list call accepts, so the request is split
+        many = await client.search("intermediate english listening", max_results=50)
+        many += await client.search("advanced english listening", max_results=30)
+        details = await client.videos([item["id"]["videoId"] for item in many])
+        print(f"videos: {len(details)} details for {len(many)} ids")
+        assert len(details) == len(many), "every id should get details"
+
+        videos = await client.search_videos("daily life", max_results=10, videoDuration="medium")
+        print(f"search_videos: {len(videos)} results")
+        assert len(videos) == 10, "search_videos should keep every result that has details"
+        for video in videos:
+            assert video["details"]["id"] == video["id"]["videoId"]
+            print(f"  {video['id']['videoId']} {video['details']['contentDetails']['duration']:>10} {video['snippet']['title']}")
+
+        print("\nYouTubeClient works against the fake API")
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    finally:
+        server.should_exit = True
+
+if __name__ == "__main__":
+    asyncio.run(main())